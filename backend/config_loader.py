@@ -19,12 +19,14 @@ PROJECT_ROOT = Path(__file__).parent.parent
 CONFIG_DIR = PROJECT_ROOT / "config"
 API_CONFIG_PATH = CONFIG_DIR / "api_config.yaml"
 
+# 配置中的环境变量引用 ${VAR_NAME}
+_ENV_VAR_RE = re.compile(r'\$\{([^}]+)\}')
+
 
 def expand_env_vars(value: Any) -> Any:
     """递归替换配置中的环境变量 ${VAR_NAME}"""
     if isinstance(value, str):
-        pattern = r'\$\{([^}]+)\}'
-        matches = re.findall(pattern, value)
+        matches = _ENV_VAR_RE.findall(value)
         for var_name in matches:
             env_value = os.environ.get(var_name, "")
             value = value.replace(f"${{{var_name}}}", env_value)
@@ -64,6 +66,7 @@ class MangaSettings:
     render_text_in_image: bool = True
     panels_per_page: int = 4
     default_character: str = "chiikawa"
+    skip_analysis_under_chars: int = 6000  # 短于此长度的论文跳过技术解读步骤（0 表示总是解读）
 
     @classmethod
     def from_dict(cls, data: dict) -> "MangaSettings":
@@ -72,7 +75,8 @@ class MangaSettings:
             aspect_ratio=data.get("aspect_ratio", "2:3"),
             render_text_in_image=data.get("render_text_in_image", True),
             panels_per_page=data.get("panels_per_page", 4),
-            default_character=data.get("default_character", "chiikawa")
+            default_character=data.get("default_character", "chiikawa"),
+            skip_analysis_under_chars=data.get("skip_analysis_under_chars", 6000)
         )
 
 
@@ -14,6 +14,8 @@ from .base import (
     ImageGenerationConfig,
     TextResponse,
     ImageResponse,
+    is_retryable_error,
+    get_retry_after,
 )
 from .nano_banana import NanoBananaEngine
 from .openrouter import OpenRouterEngine
@@ -35,6 +37,9 @@ __all__ = [
     "ImageGenerationConfig",
     "TextResponse",
     "ImageResponse",
+    # 错误分类
+    "is_retryable_error",
+    "get_retry_after",
     # 引擎实现
     "NanoBananaEngine",
     "OpenRouterEngine",
@@ -8,8 +8,19 @@ from dataclasses import dataclass, field
 from enum import Enum
 from typing import Optional, AsyncIterator, Union
 import base64
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 from pathlib import Path
 
+import httpx
+
+# 安装了 h2（httpx[http2]）时启用 HTTP/2，并发请求在同一条 TLS 连接上多路复用（可选依赖）
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 
 class MessageRole(str, Enum):
     """消息角色"""
@@ -176,3 +187,44 @@ class BaseEngine(ABC):
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(model={self.model})"
+
+
+# 可重试的 HTTP 状态码：请求超时、限流
+RETRYABLE_STATUS_CODES = frozenset({408, 429})
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """
+    判断引擎调用异常是否值得重试
+
+    网络错误、超时、429 限流和 5xx 服务端错误可以重试；
+    其他 4xx（参数错误、内容策略拒绝、鉴权失败）重试也不会成功，应立即放弃。
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status >= 500 or status in RETRYABLE_STATUS_CODES
+    return True
+
+
+def get_retry_after(exc: BaseException) -> Optional[float]:
+    """从 HTTP 错误响应中读取 Retry-After（秒），没有或无法解析时返回 None"""
+    if not isinstance(exc, httpx.HTTPStatusError):
+        return None
+
+    value = exc.response.headers.get("retry-after")
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    # HTTP-date 格式
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
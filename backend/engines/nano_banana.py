@@ -19,6 +19,7 @@ from .base import (
     ImageGenerationConfig,
     TextResponse,
     ImageResponse,
+    HTTP2_AVAILABLE,
 )
 
 
@@ -54,6 +55,7 @@ class NanoBananaEngine(BaseEngine):
         if self._client is None or self._client.is_closed:
             self._client = httpx.AsyncClient(
                 timeout=httpx.Timeout(120.0, connect=10.0),
+                http2=HTTP2_AVAILABLE,
                 headers={"Content-Type": "application/json"}
             )
         return self._client
@@ -17,6 +17,7 @@ from .base import (
     ImageGenerationConfig,
     TextResponse,
     ImageResponse,
+    HTTP2_AVAILABLE,
 )
 
 
@@ -63,6 +64,7 @@ class OpenRouterEngine(BaseEngine):
         if self._client is None or self._client.is_closed:
             self._client = httpx.AsyncClient(
                 timeout=httpx.Timeout(180.0, connect=10.0),
+                http2=HTTP2_AVAILABLE,
                 headers={
                     "Content-Type": "application/json",
                     "Authorization": f"Bearer {self.api_key}",
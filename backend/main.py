@@ -4,6 +4,7 @@ Nano Banana Station - FastAPI Application
 """
 
 import asyncio
+import logging
 from contextlib import asynccontextmanager
 from pathlib import Path
 
@@ -18,6 +19,9 @@ from engines import get_client
 # 项目根目录
 PROJECT_ROOT = Path(__file__).parent.parent
 
+# 日志输出格式与原有 print 保持一致: [模块名] 消息
+logging.basicConfig(level=logging.INFO, format="[%(name)s] %(message)s")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -14,6 +14,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from config_loader import get_config
 from engines import reset_client
 from services.manga_generator import reset_manga_generator
+from services.storyboarder import reset_storyboarder, reset_character_library
 
 
 router = APIRouter()
@@ -107,6 +108,9 @@ async def reload_config():
         # 重置所有缓存的实例
         await reset_client()
         reset_manga_generator()
+        reset_storyboarder()
+        # 角色库在进程内共享：重新扫描 character_images/ 和 characters.yaml
+        reset_character_library()
         # 重新加载配置
         config = get_config()
         config.reload()
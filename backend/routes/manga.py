@@ -117,9 +117,8 @@ async def generate_storyboard(request: TextToMangaRequest):
 
     AI 会根据论文内容自动决定需要多少个片段
     """
-    import hashlib
-    text_hash = hashlib.sha256(request.text.encode()).hexdigest()[:16]
-    print(f"[API] /storyboard: {len(request.text)} chars, hash={text_hash}, title={request.title}")
+    # 文本哈希由 Storyboarder 计算并打印，这里不再重复对整篇文本做一次 sha256
+    print(f"[API] /storyboard: {len(request.text)} chars, title={request.title}")
     try:
         storyboarder = get_storyboarder(request.character)
 
@@ -306,8 +305,8 @@ async def generate_manga_from_pdf(
         output_path = manga.save(generator.output_dir)
         print(f"[API] Saved to: {output_path}")
 
-        # 返回合并图像
-        combined_image = manga.get_combined_image()
+        # 返回合并图像（直接读取已保存的文件，避免重复拼接和编码）
+        combined_image = output_path.read_bytes()
 
         # 处理文件名编码（HTTP header 必须是 ASCII）
         import urllib.parse
@@ -343,6 +342,9 @@ async def export_manga(
         for img_b64 in panels_base64:
             img_data = base64.b64decode(img_b64)
             img = Image.open(io.BytesIO(img_data))
+            # 先统一转换为画布的 RGB 模式，paste 时走直接块拷贝
+            if img.mode != "RGB":
+                img = img.convert("RGB")
             images.append(img)
 
         if not images:
@@ -372,7 +374,7 @@ async def export_manga(
                 x += img.width
 
         buffer = io.BytesIO()
-        canvas.save(buffer, format="PNG", quality=95)
+        canvas.save(buffer, format="PNG", compress_level=1)
 
         return Response(
             content=buffer.getvalue(),
@@ -9,23 +9,151 @@ Manga Generator Service - 简化版
 """
 
 import asyncio
-import base64
+import binascii
 import io
 import json
+import logging
+import os
+import re
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Dict, List
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, UnidentifiedImageError
 
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from engines import get_client, ImageGenerationConfig, ImageContent, GenerationConfig
+from engines import (
+    get_client, ImageGenerationConfig, ImageContent, GenerationConfig,
+    is_retryable_error, get_retry_after,
+)
 from config_loader import get_config
-from services.storyboarder import Storyboard, Panel, PanelType, CharacterLibrary
+from services.storyboarder import Storyboard, Panel, PanelType, get_character_library
 from services.progress import set_stage, set_panel_progress, reset_progress
 
+# orjson 序列化更快（可选依赖），OPT_INDENT_2 的输出与 json.dumps(ensure_ascii=False, indent=2) 一致
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 日志名沿用原来 print 的 [MangaGenerator] 前缀
+log = logging.getLogger("MangaGenerator")
+
+
+# 语言代码 -> prompt 中使用的语言名称
+_LANG_NAMES = {"zh-CN": "中文", "en-US": "English", "ja-JP": "日本語"}
+_CJK_LANGUAGES = ("zh-CN", "ja-JP")
+
+# 默认负面提示词 + 强化负面提示（明确禁止 Chiikawa 角色特征）
+_DEFAULT_NEGATIVE_PROMPT = "photorealistic, 3d render, anime style, complex shading, blurry, messy lines"
+_CHARACTER_NEGATIVE_PROMPT = ", cat ears, rabbit ears, chiikawa, hachiware, usagi, inconsistent characters"
+
+# 批次大小 -> 图像尺寸，3-4 个面板统一使用 2x2 网格尺寸
+_BATCH_DIMENSIONS = {1: (1024, 1024), 2: (2048, 1024)}
+_GRID_DIMENSIONS = (2048, 2048)
+
+# 各批次大小对应的布局描述和面板位置标签（3-4 个面板使用 2x2 网格）
+_BATCH_LAYOUTS = {
+    1: ("single manga panel", ("",)),
+    2: ("1x2 horizontal manga layout", ("Left", "Right")),
+}
+_GRID_LAYOUT = ("2x2 manga grid", ("Top-Left", "Top-Right", "Bottom-Left", "Bottom-Right"))
+
+# 主题 -> prompt 中的画风名称（未知主题按 Chiikawa 处理）
+_THEME_STYLES = {"ghibli": "Ghibli", "kumomo": "Kumomo"}
+
+_KUMOMO_REMINDER = "\n\nREMINDER: Draw characters EXACTLY like the reference images above. Do NOT create different animals."
+
+
+# 文件名中不安全的字符（\w 已涵盖字母、数字、下划线和中文）
+_SAFE_TITLE_RE = re.compile(r"[^\w\- ]")
+
+# 按 MIME 类型直接指定 PIL 解码器，跳过逐个插件探测文件格式
+_PIL_FORMATS = {
+    "image/png": ("PNG",),
+    "image/jpeg": ("JPEG",),
+    "image/webp": ("WEBP",),
+}
+
+def _write_json_atomic(path: Path, data: dict) -> None:
+    """一次性写入 JSON：先写临时文件再 os.replace，读取方不会看到半截文件"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    if orjson is not None:
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        payload = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def _to_jpeg_content(image: ImageContent, quality: int = 60) -> ImageContent:
+    """
+    把 base64 图像重新编码为 JPEG（用于验证请求）
+
+    验证只需判断角色是否一致，不需要无损画质，JPEG 能大幅缩小上传体积。
+    透明背景按白底合成。
+    """
+    img = Image.open(io.BytesIO(binascii.a2b_base64(image.data)))
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, "white")
+        background.paste(img, mask=img.getchannel("A"))
+        img = background
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, progressive=True)
+    return ImageContent(
+        data=binascii.b2a_base64(buffer.getvalue(), newline=False).decode("ascii"),
+        mime_type="image/jpeg",
+        is_base64=True
+    )
+
+
+def _sanitize_title(title: str, max_len: int) -> str:
+    """把标题转换为安全的文件/文件夹名（全部字符被移除时回退为 manga）"""
+    return _SAFE_TITLE_RE.sub("", title)[:max_len] or "manga"
+
+
+def _write_panel_backup(path: Path, panel: "GeneratedPanel") -> None:
+    """把面板图像原样写入备份文件（在工作线程中执行）"""
+    path.write_bytes(panel.to_bytes())
+
+
+def _fill_white(canvas: Image.Image, box: tuple) -> None:
+    """把画布上的矩形区域填成白色（空区域跳过）"""
+    left, top, right, bottom = box
+    if right > left and bottom > top:
+        canvas.paste((255, 255, 255), box)
+
+
+def _paste_centered(canvas: Image.Image, img: Image.Image, cell: tuple) -> None:
+    """
+    把图像居中粘贴到格子里，并把格子中未被覆盖的四周补白
+
+    粘贴后立即关闭源图像，释放解码出的像素（拼接时只保留画布）。
+    源图像与画布模式不同时（如 RGBA），paste 会自动转换为画布的 RGB。
+    """
+    left, top, right, bottom = cell
+    x = left + (right - left - img.width) // 2
+    y = top + (bottom - top - img.height) // 2
+    canvas.paste(img, (x, y))
+    img_width, img_height = img.size
+    img.close()
+
+    if img_width == right - left and img_height == bottom - top:
+        # 面板正好填满格子（同尺寸批次的常见情况），无需补白
+        return
+
+    _fill_white(canvas, (left, top, right, y))
+    _fill_white(canvas, (left, y + img_height, right, bottom))
+    _fill_white(canvas, (left, y, x, y + img_height))
+    _fill_white(canvas, (x + img_width, y, right, y + img_height))
+
 
 @dataclass
 class GeneratedPanel:
@@ -37,6 +165,27 @@ class GeneratedPanel:
     characters: List[str] = field(default_factory=list)
     width: int = 0
     height: int = 0
+    # base64 解码后的原始图像字节（备份写盘与合并长图共用一次解码）
+    # 只缓存压缩后的 PNG 字节，解码后的像素体积大得多，用完即释放
+    _image_bytes: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
+
+    def to_bytes(self) -> bytes:
+        """获取解码后的图像字节，只做一次 base64 解码"""
+        if self._image_bytes is None:
+            self._image_bytes = binascii.a2b_base64(self.image_base64)
+        return self._image_bytes
+
+    def open_image(self) -> Image.Image:
+        """打开面板图像：只解析文件头拿到尺寸，像素在粘贴时才解码"""
+        data = self.to_bytes()
+        formats = _PIL_FORMATS.get(self.mime_type)
+        if formats is not None:
+            try:
+                return Image.open(io.BytesIO(data), formats=formats)
+            except UnidentifiedImageError:
+                # 引擎报告的 MIME 类型与实际数据不符（如 JPEG 标成 image/png），退回自动探测
+                log.debug("Panel %s is not %s, probing format", self.panel_number, self.mime_type)
+        return Image.open(io.BytesIO(data))
 
 
 @dataclass
@@ -48,51 +197,85 @@ class GeneratedManga:
     character_theme: str = ""
     language: str = "zh-CN"
 
-    def get_combined_image(self, layout: str = "vertical", render_dialogues: bool = False) -> bytes:
+    def get_combined_image(
+        self,
+        layout: str = "vertical",
+        render_dialogues: bool = False,
+        compress_level: int = 1
+    ) -> bytes:
         """
         合并所有面板为一张长图
 
         Args:
             layout: 布局方式 ("vertical" 竖向, "grid" 网格)
             render_dialogues: 是否额外渲染对白（Gemini 已直接渲染，通常不需要）
+            compress_level: PNG zlib 压缩级别，默认 1（编码快，文件略大）
         """
-        if not self.panels:
+        canvas = self._render_canvas(layout)
+        if canvas is None:
             return b""
 
-        images = []
-        for panel in self.panels:
-            img_data = base64.b64decode(panel.image_base64)
-            img = Image.open(io.BytesIO(img_data))
-            images.append(img)
+        buffer = io.BytesIO()
+        canvas.save(buffer, format="PNG", compress_level=compress_level)
+        return buffer.getvalue()
+
+    def save_combined_image(
+        self,
+        output_path: Path,
+        layout: str = "vertical",
+        compress_level: int = 6
+    ) -> None:
+        """
+        合并所有面板并直接写入文件
+
+        PIL 直接编码到文件，省去中间的 BytesIO 缓冲和 bytes 拷贝。
+        落盘的成品默认使用 zlib 6 级压缩，体积优先。
+        """
+        canvas = self._render_canvas(layout)
+        if canvas is None:
+            Path(output_path).write_bytes(b"")
+            return
+
+        canvas.save(output_path, format="PNG", compress_level=compress_level)
+
+    def _render_canvas(self, layout: str) -> Optional[Image.Image]:
+        """
+        拼接所有面板为画布，没有面板时返回 None
+
+        面板先只读取文件头确定尺寸（面板上记录的是请求尺寸，实际输出可能不同），
+        拼接时逐张解码、粘贴、释放，峰值内存约为画布加一张面板。
+        """
+        if not self.panels:
+            return None
+
+        images = [panel.open_image() for panel in self.panels]
 
         if layout == "vertical":
             return self._combine_vertical(images)
         else:
             return self._combine_grid(images)
 
-    def _combine_vertical(self, images: List[Image.Image]) -> bytes:
+    def _combine_vertical(self, images: List[Image.Image]) -> Image.Image:
         """垂直拼接图像"""
         max_width = max(img.width for img in images)
         gap = 20
         total_height = sum(img.height for img in images) + gap * (len(images) - 1)
 
-        canvas = Image.new("RGB", (max_width, total_height), "white")
+        # 不做整幅白色填充，面板覆盖的区域直接粘贴，只补白间隙
+        canvas = Image.new("RGB", (max_width, total_height), None)
 
         y_offset = 0
-        for img in images:
-            x_offset = (max_width - img.width) // 2
-            canvas.paste(img, (x_offset, y_offset))
-            y_offset += img.height + gap
+        for idx, img in enumerate(images):
+            _paste_centered(canvas, img, (0, y_offset, max_width, y_offset + img.height))
+            y_offset += img.height
+            if idx < len(images) - 1:
+                _fill_white(canvas, (0, y_offset, max_width, y_offset + gap))
+                y_offset += gap
 
-        buffer = io.BytesIO()
-        canvas.save(buffer, format="PNG", quality=95)
-        return buffer.getvalue()
+        return canvas
 
-    def _combine_grid(self, images: List[Image.Image], cols: int = 2) -> bytes:
+    def _combine_grid(self, images: List[Image.Image], cols: int = 2) -> Image.Image:
         """网格拼接图像"""
-        if not images:
-            return b""
-
         rows = (len(images) + cols - 1) // cols
         cell_width = max(img.width for img in images)
         cell_height = max(img.height for img in images)
@@ -101,18 +284,26 @@ class GeneratedManga:
         canvas_width = cell_width * cols + gap * (cols - 1)
         canvas_height = cell_height * rows + gap * (rows - 1)
 
-        canvas = Image.new("RGB", (canvas_width, canvas_height), "white")
-
-        for idx, img in enumerate(images):
-            row = idx // cols
-            col = idx % cols
-            x = col * (cell_width + gap) + (cell_width - img.width) // 2
-            y = row * (cell_height + gap) + (cell_height - img.height) // 2
-            canvas.paste(img, (x, y))
+        # 不做整幅白色填充，只补白格子间隙、面板四周留白和空格子
+        canvas = Image.new("RGB", (canvas_width, canvas_height), None)
+
+        for col in range(1, cols):
+            x = col * (cell_width + gap) - gap
+            _fill_white(canvas, (x, 0, x + gap, canvas_height))
+        for row in range(1, rows):
+            y = row * (cell_height + gap) - gap
+            _fill_white(canvas, (0, y, canvas_width, y + gap))
+
+        for idx in range(rows * cols):
+            x = (idx % cols) * (cell_width + gap)
+            y = (idx // cols) * (cell_height + gap)
+            cell = (x, y, x + cell_width, y + cell_height)
+            if idx < len(images):
+                _paste_centered(canvas, images[idx], cell)
+            else:
+                _fill_white(canvas, cell)
 
-        buffer = io.BytesIO()
-        canvas.save(buffer, format="PNG", quality=95)
-        return buffer.getvalue()
+        return canvas
 
     def save(self, output_dir: Path) -> Path:
         """保存漫画到文件"""
@@ -121,15 +312,11 @@ class GeneratedManga:
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         # 安全的文件名：保留中文字符
-        safe_title = "".join(c for c in self.title if c.isalnum() or c in "_ -" or '\u4e00' <= c <= '\u9fff')[:30]
-        if not safe_title:
-            safe_title = "manga"
+        safe_title = _sanitize_title(self.title, 30)
         filename = f"{safe_title}_{timestamp}.png"
 
-        combined = self.get_combined_image()
         output_path = output_dir / filename
-        with open(output_path, "wb") as f:
-            f.write(combined)
+        self.save_combined_image(output_path)
 
         return output_path
 
@@ -148,12 +335,33 @@ class MangaGenerator:
         self.config = get_config()
         self.output_dir = Path(__file__).parent.parent.parent / "output"
         self.output_dir.mkdir(exist_ok=True)
-        self.char_lib = CharacterLibrary()
+        self.char_lib = get_character_library()
         self.panels_per_batch = 4  # 每次生成4个panel
+        self.max_concurrent_batches = 4  # 同时进行的批次请求数（受 API 并发配额限制）
+        # 参考图缓存 (path -> ImageContent)，每张参考图只读取和编码一次
+        self._ref_cache: Dict[str, ImageContent] = {}
+        # 按角色组合缓存的原创角色参考图列表 (frozenset(角色) -> [ImageContent])
+        self._kumomo_ref_sets: Dict[frozenset, List[ImageContent]] = {}
+        # 验证用的 JPEG 参考图缓存 (原图 base64 -> JPEG ImageContent)
+        self._validation_ref_cache: Dict[str, ImageContent] = {}
+        # 占位符底图缓存 ((width, height, layout) -> Image)
+        self._placeholder_templates: Dict[tuple, Image.Image] = {}
         # 动态构建角色名映射 - 从 character_images 目录加载
         self.kumomo_char_map = {}
         for char_name in self.char_lib.get_kumomo_character_names():
             self.kumomo_char_map[char_name] = char_name
+        # 剧本中的角色写法 -> 标准角色名（None 表示不是原创角色），按需填充
+        self._kumomo_alias_cache: Dict[str, Optional[str]] = {}
+        # 原创角色相关的提示词只依赖角色集合，构建一次复用
+        char_names = self.char_lib.get_kumomo_character_names()
+        self._kumomo_char_ref = self._build_kumomo_char_ref(char_names)
+        self._validate_prompt = self._build_validate_prompt(char_names)
+        # 原创角色参考图 (小写文件名, 路径, 图中包含的标准角色名)，只扫描一次目录
+        self._kumomo_ref_files: List[tuple] = []
+        for img_path in self.char_lib.get_all_kumomo_reference_images():
+            filename = Path(img_path).name.lower()
+            owners = frozenset(name for name in self.kumomo_char_map.values() if name in filename)
+            self._kumomo_ref_files.append((filename, img_path, owners))
 
     async def generate_from_storyboard(
         self,
@@ -163,12 +371,12 @@ class MangaGenerator:
         """
         根据分镜脚本生成漫画
 
-        每次生成4个panel（2x2网格），提高效率
+        每次生成4个panel（2x2网格），各批次并发请求，提高效率
         """
-        print(f"[MangaGenerator] Starting: '{storyboard.title}' with {len(storyboard.panels)} panels (theme: {storyboard.character_theme})")
-
-        # 存储当前主题用于生成
-        self.current_theme = storyboard.character_theme
+        log.info(
+            "Starting: '%s' with %s panels (theme: %s)",
+            storyboard.title, len(storyboard.panels), storyboard.character_theme
+        )
 
         # Report progress
         set_stage("generating", f"Starting manga generation")
@@ -177,86 +385,126 @@ class MangaGenerator:
         # 创建以 PDF 标题命名的子文件夹
         session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         # 安全的文件夹名：保留中文字符，移除特殊字符
-        safe_title = "".join(c for c in storyboard.title if c.isalnum() or c in "_ -" or '\u4e00' <= c <= '\u9fff')[:50]
-        if not safe_title:
-            safe_title = "manga"
+        safe_title = _sanitize_title(storyboard.title, 50)
 
         # 每次生成创建独立的子文件夹
         manga_folder = self.output_dir / f"{safe_title}_{session_id}"
         manga_folder.mkdir(parents=True, exist_ok=True)
         progress_dir = manga_folder  # 所有文件保存在这个文件夹中
 
-        print(f"[MangaGenerator] Output folder: {manga_folder}")
-
-        generated_panels = []
-        failed_count = 0
+        log.info("Output folder: %s", manga_folder)
 
         # 动态批量生成
         total_panels = len(storyboard.panels)
-        is_cjk = storyboard.language in ["zh-CN", "ja-JP"]
+        is_cjk = storyboard.language in _CJK_LANGUAGES
 
-        # 使用动态批次大小
-        panel_index = 0
-        batch_num = 0
+        # 整个分镜共用的生成参数，只解析一次
+        negative_prompt = self._resolve_negative_prompt()
+        style = self.config.manga_settings.default_style
 
+        # 预先切分所有批次（批次之间互不依赖）
+        batches: List[tuple] = []  # (起始索引, 批次面板)
+        panel_index = 0
         while panel_index < total_panels:
-            # 计算这批的最佳大小
             batch_size = self._calculate_optimal_batch_size(
                 storyboard.panels[panel_index:panel_index + 4],
                 is_cjk
             )
             batch_end = min(panel_index + batch_size, total_panels)
-            batch_panels = storyboard.panels[panel_index:batch_end]
-            batch_num += 1
-
-            try:
-                print(f"[MangaGenerator] Generating batch {batch_num}: panels {panel_index+1}-{batch_end}/{total_panels} (batch_size={len(batch_panels)})...")
-
-                result = await self._generate_panel_batch(batch_panels, storyboard.language)
-                generated_panels.append(result)
-
-                # Update progress
-                set_panel_progress(batch_end, total_panels)
-
-                # 保存批次图像（每个批次单独备份）
-                if save_progress and result.image_base64:
-                    panel_path = progress_dir / f"{safe_title}_{session_id}_batch{batch_num:03d}.png"
-                    try:
-                        img_data = base64.b64decode(result.image_base64)
-                        with open(panel_path, "wb") as f:
-                            f.write(img_data)
-                    except Exception as e:
-                        print(f"[MangaGenerator] Failed to save: {e}")
-
-            except Exception as e:
-                failed_count += 1
-                print(f"[MangaGenerator] Batch {batch_num} failed: {e}")
-                # 创建占位符
-                width, height = self._get_batch_dimensions(len(batch_panels))
-                generated_panels.append(self._create_placeholder_batch(batch_panels, width, height))
-
-            # 更新索引到下一批
+            batches.append((panel_index, storyboard.panels[panel_index:batch_end]))
             panel_index = batch_end
 
+        # 并发生成各批次：耗时主要在 API 往返，用信号量限制同时请求数
+        semaphore = asyncio.Semaphore(self.max_concurrent_batches)
+        results: List[Optional[GeneratedPanel]] = [None] * len(batches)
+        failed_count = 0
+        completed_panels = 0
+
+        async def run_batch(batch_idx: int, start: int, batch_panels: List[Panel]) -> None:
+            nonlocal failed_count, completed_panels
+            batch_num = batch_idx + 1
+
+            async with semaphore:
+                try:
+                    log.info(
+                        "Generating batch %s/%s: panels %s-%s/%s (batch_size=%s)...",
+                        batch_num, len(batches), start + 1, start + len(batch_panels),
+                        total_panels, len(batch_panels)
+                    )
+
+                    result = await self._generate_panel_batch(
+                        batch_panels, storyboard.language,
+                        theme=storyboard.character_theme,
+                        negative_prompt=negative_prompt, style=style
+                    )
+                    backup = save_progress and bool(result.image_base64)
+
+                except Exception as e:
+                    failed_count += 1
+                    log.warning("Batch %s failed: %s", batch_num, e)
+                    # 创建占位符
+                    width, height = self._get_batch_dimensions(len(batch_panels))
+                    result = self._create_placeholder_batch(batch_panels, width, height)
+                    backup = False
+
+            # 按批次序号放回，保证合并顺序与分镜一致
+            results[batch_idx] = result
+
+            # Update progress（单线程事件循环内计数，无需加锁）
+            completed_panels += len(batch_panels)
+            set_panel_progress(completed_panels, total_panels)
+
+            # 保存批次图像（每个批次单独备份）
+            # 已释放并发名额，解码和写盘放到线程中，与后续批次的 API 请求重叠
+            if backup:
+                panel_path = progress_dir / f"{safe_title}_{session_id}_batch{batch_num:03d}.png"
+                try:
+                    await asyncio.to_thread(_write_panel_backup, panel_path, result)
+                except Exception as e:
+                    log.warning("Failed to save: %s", e)
+
+        await asyncio.gather(*(
+            run_batch(i, start, batch_panels)
+            for i, (start, batch_panels) in enumerate(batches)
+        ))
+        generated_panels = [r for r in results if r is not None]
+
+        manga = GeneratedManga(
+            title=storyboard.title,
+            panels=generated_panels,
+            character_theme=storyboard.character_theme,
+            language=storyboard.language
+        )
+
         # 保存最终结果
         if save_progress and generated_panels:
             await self._save_final_manga(
-                storyboard, generated_panels, progress_dir, safe_title, session_id
+                storyboard, manga, progress_dir, safe_title, session_id
             )
 
-        print(f"[MangaGenerator] Completed: {batch_num} batches ({total_panels} panels), {failed_count} failed")
+        log.info("Completed: %s batches (%s panels), %s failed", len(batches), total_panels, failed_count)
 
         # Mark as completed
         set_stage("completed", f"Generated {total_panels} panels in {len(generated_panels)} batches")
 
-        return GeneratedManga(
-            title=storyboard.title,
-            panels=generated_panels,
-            character_theme=storyboard.character_theme,
-            language=storyboard.language
-        )
+        return manga
 
-    async def _generate_panel_batch(self, panels: List[Panel], language: str, max_retries: int = 5) -> GeneratedPanel:
+    def _resolve_negative_prompt(self) -> str:
+        """读取配置中的负面提示词，并追加角色相关的禁止项"""
+        negative_prompt = getattr(self.config.manga_settings, 'negative_prompt', None)
+        if not negative_prompt:
+            negative_prompt = _DEFAULT_NEGATIVE_PROMPT
+        return negative_prompt + _CHARACTER_NEGATIVE_PROMPT
+
+    async def _generate_panel_batch(
+        self,
+        panels: List[Panel],
+        language: str,
+        max_retries: int = 5,
+        theme: str = "chiikawa",
+        negative_prompt: Optional[str] = None,
+        style: Optional[str] = None
+    ) -> GeneratedPanel:
         """
         批量生成多个漫画格（带验证和强化纠错）
 
@@ -268,9 +516,6 @@ class MangaGenerator:
         """
         client = await get_client()
 
-        # 获取当前主题
-        theme = getattr(self, 'current_theme', 'chiikawa')
-
         # 根据面板数量确定尺寸
         width, height = self._get_batch_dimensions(len(panels))
 
@@ -279,27 +524,24 @@ class MangaGenerator:
         if theme == "kumomo":
             for p in panels:
                 for c in p.characters:
-                    norm_c = c.lower().strip()
                     # 尝试映射到标准名称 kumo/nezu/papi
-                    for key, val in self.kumomo_char_map.items():
-                        if key in norm_c:
-                            batch_characters.add(val)
-                            break
-            print(f"[MangaGenerator] Active characters in batch: {batch_characters}")
+                    canonical = self._resolve_kumomo_character(c)
+                    if canonical:
+                        batch_characters.add(canonical)
+            log.debug("Active characters in batch: %s", batch_characters)
 
         # 构建基础 prompt (传入 batch_characters)
         base_prompt = self._build_batch_prompt(panels, language, theme, batch_characters)
 
-        negative_prompt = getattr(self.config.manga_settings, 'negative_prompt', None)
-        if not negative_prompt:
-            negative_prompt = "photorealistic, 3d render, anime style, complex shading, blurry, messy lines"
-        # 强化负面提示 - 明确禁止 Chiikawa 角色特征
-        negative_prompt += ", cat ears, rabbit ears, chiikawa, hachiware, usagi, inconsistent characters"
+        if negative_prompt is None:
+            negative_prompt = self._resolve_negative_prompt()
+        if style is None:
+            style = self.config.manga_settings.default_style
 
         config = ImageGenerationConfig(
             width=width,
             height=height,
-            style=self.config.manga_settings.default_style,
+            style=style,
             negative_prompt=negative_prompt,
             temperature=0.2  # 低温度确保角色一致性
         )
@@ -308,12 +550,12 @@ class MangaGenerator:
         reference_images = []
         if theme == "kumomo":
             chars_to_load = list(batch_characters) if batch_characters else self.char_lib.get_kumomo_character_names()
-            reference_images = self._load_specific_kumomo_references(chars_to_load)
+            reference_images = await self._load_specific_kumomo_references(chars_to_load)
         else:
             for panel in panels[:1]:
-                reference_images.extend(self._load_reference_images(panel))
+                reference_images.extend(await self._load_reference_images(panel))
         if reference_images:
-            print(f"[MangaGenerator] Using {len(reference_images)} reference images")
+            log.debug("Using %s reference images", len(reference_images))
 
         # 生成 + 验证循环（强化纠错）
         validation_feedback = ""
@@ -329,17 +571,17 @@ class MangaGenerator:
                 if validation_feedback:
                     prompt = f"""RETRY: {validation_feedback}
 {base_prompt}"""
-                    print(f"[MangaGenerator] Attempt {attempt+1}/{max_retries}: Regenerating with feedback: {validation_feedback}")
+                    log.info("Attempt %s/%s: Regenerating with feedback: %s", attempt+1, max_retries, validation_feedback)
                 else:
                     prompt = base_prompt
-                    print(f"[MangaGenerator] Attempt {attempt+1}/{max_retries}: Generating...")
+                    log.info("Attempt %s/%s: Generating...", attempt+1, max_retries)
 
                 # 生成图像
                 response = await client.generate_image(prompt, config, reference_images=reference_images)
 
                 if response.images:
                     image = response.images[0]
-                    print(f"[MangaGenerator] Batch generated ({len(panels)} panels)")
+                    log.info("Batch generated (%s panels)", len(panels))
 
                     # kumomo 主题: 每次都验证，确保角色正确
                     if theme == "kumomo":
@@ -354,7 +596,7 @@ class MangaGenerator:
                         )
 
                         if is_valid:
-                            print(f"[MangaGenerator] ✓ Validation PASSED on attempt {attempt+1}")
+                            log.info("✓ Validation PASSED on attempt %s", attempt+1)
                             return GeneratedPanel(
                                 panel_number=panels[0].panel_number,
                                 image_base64=image.data,
@@ -365,13 +607,13 @@ class MangaGenerator:
                                 height=height
                             )
                         else:
-                            print(f"[MangaGenerator] ✗ Validation FAILED on attempt {attempt+1}: {feedback}")
+                            log.info("✗ Validation FAILED on attempt %s: %s", attempt+1, feedback)
                             validation_feedback = feedback
                             last_valid_image = image  # 保存这次生成的图像以防万一
 
                             # 如果是最后一次尝试，返回最后生成的图像（虽然未通过验证）
                             if attempt == max_retries - 1:
-                                print(f"[MangaGenerator] ⚠ All {max_retries} attempts failed validation, returning last generated image")
+                                log.warning("⚠ All %s attempts failed validation, returning last generated image", max_retries)
                                 return GeneratedPanel(
                                     panel_number=panels[0].panel_number,
                                     image_base64=image.data,
@@ -395,19 +637,29 @@ class MangaGenerator:
                         )
 
             except Exception as e:
-                print(f"[MangaGenerator] Attempt {attempt+1}/{max_retries} failed with error: {e}")
+                log.warning("Attempt %s/%s failed with error: %s", attempt+1, max_retries, e)
+
+                # 参数错误/内容策略拒绝等 4xx 重试也不会成功，直接放弃
+                if not is_retryable_error(e):
+                    log.warning("Non-retryable error, giving up on this batch")
+                    break
 
                 if attempt < max_retries - 1:
-                    wait_time = min(2 ** attempt, 8)  # 最多等待 8 秒
-                    print(f"[MangaGenerator] Waiting {wait_time}s before retry...")
+                    # 限流时优先遵循服务端的 Retry-After
+                    retry_after = get_retry_after(e)
+                    if retry_after is not None:
+                        wait_time = min(retry_after, 60)  # 最多等待 60 秒
+                    else:
+                        wait_time = min(2 ** attempt, 8)  # 最多等待 8 秒
+                    log.info("Waiting %ss before retry...", wait_time)
                     await asyncio.sleep(wait_time)
 
         # 所有尝试都失败了
-        print(f"[MangaGenerator] All {max_retries} attempts failed for batch")
+        log.warning("All %s attempts failed for batch", max_retries)
 
         # 如果有之前生成的图像（未通过验证），仍然返回它
         if last_valid_image:
-            print(f"[MangaGenerator] Returning last generated image despite validation failure")
+            log.info("Returning last generated image despite validation failure")
             return GeneratedPanel(
                 panel_number=panels[0].panel_number,
                 image_base64=last_valid_image.data,
@@ -420,6 +672,21 @@ class MangaGenerator:
 
         return self._create_placeholder_batch(panels, width, height)
 
+    def _resolve_kumomo_character(self, name: str) -> Optional[str]:
+        """把剧本中的角色名映射到原创角色标准名，结果按写法缓存"""
+        norm = name.lower().strip()
+        if norm in self._kumomo_alias_cache:
+            return self._kumomo_alias_cache[norm]
+
+        canonical = None
+        for key, val in self.kumomo_char_map.items():
+            if key in norm:
+                canonical = val
+                break
+
+        self._kumomo_alias_cache[norm] = canonical
+        return canonical
+
     def _calculate_optimal_batch_size(self, panels: List[Panel], is_cjk: bool) -> int:
         """
         固定返回 4 个面板的批次大小
@@ -439,12 +706,7 @@ class MangaGenerator:
         - 2 panels: 2048x1024 (横向排列)
         - 3-4 panels: 2048x2048 (2x2网格)
         """
-        if batch_size == 1:
-            return (1024, 1024)
-        elif batch_size == 2:
-            return (2048, 1024)
-        else:
-            return (2048, 2048)
+        return _BATCH_DIMENSIONS.get(batch_size, _GRID_DIMENSIONS)
 
     async def _validate_generated_image(
         self,
@@ -468,29 +730,6 @@ class MangaGenerator:
 
         client = await get_client()
 
-        # 动态生成验证提示词
-        char_names = self.char_lib.get_kumomo_character_names()
-        num_chars = len(char_names)
-
-        # 构建角色映射说明
-        image_mapping = "\n".join([f"Image {i+1} = {name}'s design" for i, name in enumerate(char_names)])
-        last_img_num = num_chars + 1
-
-        validate_prompt = f"""Look at the reference character designs (Image 1-{num_chars}) and the generated manga (Image {last_img_num}).
-
-{image_mapping}
-Image {last_img_num} = generated manga
-
-Question: Do the characters in Image {last_img_num} look EXACTLY like their reference designs?
-
-IMPORTANT: The character must have the SAME appearance as the reference image.
-A different animal is NOT the same character.
-
-Answer only: PASS or FAIL"""
-
-        # 发送参考图 + 生成的漫画图进行验证
-        all_images = reference_images + [generated_image]
-
         config = GenerationConfig(
             temperature=0.0,  # 最低温度 - 确定性输出
             top_p=0.1,        # 极低采样 - 只选最可能的结果
@@ -499,14 +738,19 @@ Answer only: PASS or FAIL"""
         )
 
         try:
+            # 发送参考图 + 生成的漫画图进行验证（统一转为 JPEG 以减少上传体积）
+            # 解码失败（URL 图像、损坏的数据）也按验证出错处理，不影响重试循环保留生成结果
+            all_images = [await self._get_validation_reference(img) for img in reference_images]
+            all_images.append(await asyncio.to_thread(_to_jpeg_content, generated_image))
+
             response = await client.generate_text(
-                prompt=validate_prompt,
+                prompt=self._validate_prompt,
                 images=all_images,
                 config=config
             )
 
             result = response.content.strip().upper()
-            print(f"[MangaGenerator] Validation result: {result}")
+            log.info("Validation result: %s", result)
 
             # 简单判断：只有明确 PASS 才通过，其他都失败
             if "PASS" in result and "FAIL" not in result:
@@ -515,10 +759,46 @@ Answer only: PASS or FAIL"""
                 return False, "Characters don't match reference"
 
         except Exception as e:
-            print(f"[MangaGenerator] Validation error: {e}")
+            log.warning("Validation error: %s", e)
             # 验证出错时也默认失败，宁可重试
             return False, f"Validation error: {str(e)[:50]}"
 
+    async def _get_validation_reference(self, image: ImageContent) -> ImageContent:
+        """获取参考图的 JPEG 版本，每张参考图只转换一次"""
+        # 参考图来自 _ref_cache，base64 字符串对象复用，哈希只计算一次
+        cached = self._validation_ref_cache.get(image.data)
+        if cached is None:
+            cached = await asyncio.to_thread(_to_jpeg_content, image)
+            self._validation_ref_cache[image.data] = cached
+        return cached
+
+    @staticmethod
+    def _build_validate_prompt(char_names: List[str]) -> str:
+        """构建角色一致性验证提示词（思维链 CoT 版）"""
+        num_chars = len(char_names)
+
+        # 构建角色映射说明
+        image_mapping = "\n".join([f"Image {i+1} = {name}'s design" for i, name in enumerate(char_names)])
+        last_img_num = num_chars + 1
+
+        return f"""Look at the reference character designs (Image 1-{num_chars}) and the generated manga (Image {last_img_num}).
+
+{image_mapping}
+Image {last_img_num} = generated manga
+
+Question: Do the characters in Image {last_img_num} look EXACTLY like their reference designs?
+
+IMPORTANT: The character must have the SAME appearance as the reference image.
+A different animal is NOT the same character.
+
+Answer only: PASS or FAIL"""
+
+    @staticmethod
+    def _build_kumomo_char_ref(char_names: List[str]) -> str:
+        """构建原创角色参考图说明（放在生成 prompt 开头）"""
+        char_lines = [f"- Image {i+1} = {name} (draw {name} EXACTLY like this)" for i, name in enumerate(char_names)]
+        return "CHARACTER DESIGNS (attached images above):\n" + "\n".join(char_lines) + "\n\n"
+
     def _build_batch_prompt(self, panels: List[Panel], language: str, theme: str = "chiikawa", batch_characters: set = None) -> str:
         """
         构建批量图像生成 prompt - 使用详细的剧本信息
@@ -530,21 +810,12 @@ Answer only: PASS or FAIL"""
 
         batch_characters: kumomo 主题时，当前批次出现的角色集合
         """
-        lang_map = {"zh-CN": "中文", "en-US": "English", "ja-JP": "日本語"}
-        lang_name = lang_map.get(language, "中文")
-        is_cjk = language in ["zh-CN", "ja-JP"]
+        lang_name = _LANG_NAMES.get(language, "中文")
+        is_cjk = language in _CJK_LANGUAGES
         num_panels = len(panels)
 
         # 根据面板数量选择布局和位置标签
-        if num_panels == 1:
-            layout_desc = "single manga panel"
-            positions = [""]
-        elif num_panels == 2:
-            layout_desc = "1x2 horizontal manga layout"
-            positions = ["Left", "Right"]
-        else:
-            layout_desc = "2x2 manga grid"
-            positions = ["Top-Left", "Top-Right", "Bottom-Left", "Bottom-Right"]
+        layout_desc, positions = _BATCH_LAYOUTS.get(num_panels, _GRID_LAYOUT)
 
         # 构建详细的面板描述
         panel_lines = []
@@ -561,11 +832,7 @@ Answer only: PASS or FAIL"""
             visual = getattr(panel, 'visual_description', '') or ""
 
             # 对白
-            dialogues = []
-            if panel.dialogue:
-                for char, text in panel.dialogue.items():
-                    dialogues.append(f'{char}: "{text}"')
-            dialogue_str = " | ".join(dialogues) if dialogues else ""
+            dialogue_str = " | ".join(f'{char}: "{text}"' for char, text in panel.dialogue.items()) if panel.dialogue else ""
 
             # 旁白/解释
             narration = getattr(panel, 'narration', '') or ""
@@ -573,31 +840,25 @@ Answer only: PASS or FAIL"""
             # 背景
             bg = getattr(panel, 'background', 'simple classroom') or "simple classroom"
 
-            # 组合成详细描述
+            # 组合成详细描述（收集各行后一次 join）
+            parts = []
             if pos:
-                desc = f"[{pos}{title}]\n"
-            else:
-                desc = ""
-            desc += f"Characters: {chars}\n"
+                parts.append(f"[{pos}{title}]")
+            parts.append(f"Characters: {chars}")
             if visual:
-                desc += f"Visual: {visual}\n"
+                parts.append(f"Visual: {visual}")
             if dialogue_str:
-                desc += f"Dialogue: {dialogue_str}\n"
+                parts.append(f"Dialogue: {dialogue_str}")
             if narration:
-                desc += f"Narration box: {narration}\n"
-            desc += f"Background: {bg}"
+                parts.append(f"Narration box: {narration}")
+            parts.append(f"Background: {bg}")
 
-            panel_lines.append(desc)
+            panel_lines.append("\n".join(parts))
 
         panels_text = "\n---\n".join(panel_lines)
 
         # 风格描述
-        if theme == "ghibli":
-            style = "Ghibli"
-        elif theme == "kumomo":
-            style = "Kumomo"
-        else:
-            style = "Chiikawa"
+        style = _THEME_STYLES.get(theme, "Chiikawa")
 
         # 文字说明
         if is_cjk:
@@ -609,11 +870,8 @@ Answer only: PASS or FAIL"""
         char_ref_start = ""
         char_ref_end = ""
         if theme == "kumomo":
-            # 动态生成角色参考说明
-            char_names = self.char_lib.get_kumomo_character_names()
-            char_lines = [f"- Image {i+1} = {name} (draw {name} EXACTLY like this)" for i, name in enumerate(char_names)]
-            char_ref_start = "CHARACTER DESIGNS (attached images above):\n" + "\n".join(char_lines) + "\n\n"
-            char_ref_end = "\n\nREMINDER: Draw characters EXACTLY like the reference images above. Do NOT create different animals."
+            char_ref_start = self._kumomo_char_ref
+            char_ref_end = _KUMOMO_REMINDER
 
         prompt = f"""{char_ref_start}{layout_desc}, {style} style. {text_note}
 
@@ -621,39 +879,62 @@ Answer only: PASS or FAIL"""
 
         return prompt
 
+    def _get_placeholder_template(self, width: int, height: int, layout: int) -> Image.Image:
+        """获取占位符底图（背景、边框、分隔线），按尺寸和布局缓存"""
+        key = (width, height, layout)
+        template = self._placeholder_templates.get(key)
+        if template is not None:
+            return template
+
+        template = Image.new("RGB", (width, height), "#f5f5f5")
+        draw = ImageDraw.Draw(template)
+        draw.rectangle([5, 5, width-5, height-5], outline="#cccccc", width=2)
+
+        mid_x, mid_y = width // 2, height // 2
+        if layout == 2:
+            # 横向排列
+            draw.line([(mid_x, 0), (mid_x, height)], fill="#cccccc", width=2)
+        elif layout == 4:
+            # 2x2网格
+            draw.line([(mid_x, 0), (mid_x, height)], fill="#cccccc", width=2)
+            draw.line([(0, mid_y), (width, mid_y)], fill="#cccccc", width=2)
+
+        self._placeholder_templates[key] = template
+        return template
+
     def _create_placeholder_batch(self, panels: List[Panel], width: int, height: int) -> GeneratedPanel:
         """创建批量占位符，支持不同布局"""
-        img = Image.new("RGB", (width, height), "#f5f5f5")
-        draw = ImageDraw.Draw(img)
         num_panels = len(panels)
-
-        draw.rectangle([5, 5, width-5, height-5], outline="#cccccc", width=2)
+        mid_x, mid_y = width // 2, height // 2
 
         if num_panels == 1:
             # 单张图
-            positions = [(width // 2, height // 2)]
+            layout = 1
+            positions = [(mid_x, mid_y)]
         elif num_panels == 2:
             # 横向排列
-            mid_x = width // 2
-            draw.line([(mid_x, 0), (mid_x, height)], fill="#cccccc", width=2)
-            positions = [(mid_x // 2, height // 2), (mid_x + mid_x // 2, height // 2)]
+            layout = 2
+            positions = [(mid_x // 2, mid_y), (mid_x + mid_x // 2, mid_y)]
         else:
             # 2x2网格
-            mid_x, mid_y = width // 2, height // 2
-            draw.line([(mid_x, 0), (mid_x, height)], fill="#cccccc", width=2)
-            draw.line([(0, mid_y), (width, mid_y)], fill="#cccccc", width=2)
+            layout = 4
             positions = [(mid_x//2, mid_y//2), (mid_x + mid_x//2, mid_y//2),
                          (mid_x//2, mid_y + mid_y//2), (mid_x + mid_x//2, mid_y + mid_y//2)]
 
+        # 复制缓存的底图，只需绘制面板编号
+        img = self._get_placeholder_template(width, height, layout).copy()
+        draw = ImageDraw.Draw(img)
+
         for i, panel in enumerate(panels):
             if i < len(positions):
                 x, y = positions[i]
                 text = f"Panel {panel.panel_number}"
                 draw.text((x, y), text, fill="#999999", anchor="mm")
 
+        # 纯色占位图压缩率本身很高，使用最快的压缩级别
         buffer = io.BytesIO()
-        img.save(buffer, format="PNG")
-        img_base64 = base64.b64encode(buffer.getvalue()).decode()
+        img.save(buffer, format="PNG", compress_level=1)
+        img_base64 = binascii.b2a_base64(buffer.getvalue(), newline=False).decode("ascii")
 
         return GeneratedPanel(
             panel_number=panels[0].panel_number if panels else 0,
@@ -664,7 +945,7 @@ Answer only: PASS or FAIL"""
             height=height
         )
 
-    def _load_reference_images(self, panel: Panel) -> List[ImageContent]:
+    async def _load_reference_images(self, panel: Panel) -> List[ImageContent]:
         """加载参考图片（可选）"""
         reference_images = []
 
@@ -675,99 +956,94 @@ Answer only: PASS or FAIL"""
 
         for img_path in image_paths[:4]:  # 限制数量
             try:
-                with open(img_path, "rb") as f:
-                    img_data = base64.b64encode(f.read()).decode()
-
-                ext = Path(img_path).suffix.lower()
-                mime_map = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
-                mime_type = mime_map.get(ext, "image/png")
-
-                reference_images.append(ImageContent(
-                    data=img_data,
-                    mime_type=mime_type,
-                    is_base64=True
-                ))
+                reference_images.append(await self._load_image_content(img_path))
             except Exception as e:
-                print(f"[MangaGenerator] Failed to load ref image: {e}")
+                log.warning("Failed to load ref image: %s", e)
 
         return reference_images
 
-    def _load_all_kumomo_references(self) -> List[ImageContent]:
+    async def _load_image_content(self, img_path: str) -> ImageContent:
+        """读取参考图并编码为 base64（按路径缓存，整个生成器生命周期内只读一次）"""
+        cached = self._ref_cache.get(img_path)
+        if cached is not None:
+            return cached
+
+        # 首次读取放到线程池，避免磁盘 I/O 阻塞其他并发批次
+        image = await asyncio.to_thread(self._read_image_content, img_path)
+        self._ref_cache[img_path] = image
+        return image
+
+    @staticmethod
+    def _read_image_content(img_path: str) -> ImageContent:
+        """同步读取图片文件并编码为 base64 ImageContent"""
+        with open(img_path, "rb") as f:
+            img_data = binascii.b2a_base64(f.read(), newline=False).decode("ascii")
+
+        ext = Path(img_path).suffix.lower()
+        mime_map = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
+        mime_type = mime_map.get(ext, "image/png")
+
+        return ImageContent(
+            data=img_data,
+            mime_type=mime_type,
+            is_base64=True
+        )
+
+    async def _load_all_kumomo_references(self) -> List[ImageContent]:
         """加载所有原创角色参考图"""
-        return self._load_specific_kumomo_references(self.char_lib.get_kumomo_character_names())
+        return await self._load_specific_kumomo_references(self.char_lib.get_kumomo_character_names())
 
-    def _load_specific_kumomo_references(self, required_chars: List[str]) -> List[ImageContent]:
+    async def _load_specific_kumomo_references(self, required_chars: List[str]) -> List[ImageContent]:
         """
         动态加载指定的 Kumomo 原创角色参考图片
 
         只加载当前批次需要的角色，减少干扰
         """
-        reference_images = []
+        required = frozenset(required_chars)
+        cached = self._kumomo_ref_sets.get(required)
+        if cached is not None:
+            return list(cached)
 
-        all_paths = self.char_lib.get_all_kumomo_reference_images()
-        print(f"[MangaGenerator] Filtering references for: {required_chars}")
+        reference_images = []
+        all_loaded = True
 
-        for img_path in all_paths:
-            path_obj = Path(img_path)
-            filename = path_obj.name.lower()
+        log.debug("Filtering references for: %s", required_chars)
 
+        for filename, img_path, owners in self._kumomo_ref_files:
             # 检查此图片是否属于所需角色
-            is_needed = False
-            for rc in required_chars:
-                if rc in filename:
-                    is_needed = True
-                    break
-
-            if not is_needed:
+            if not owners & required:
                 continue
 
             try:
-                with open(img_path, "rb") as f:
-                    img_data = base64.b64encode(f.read()).decode()
-
-                ext = path_obj.suffix.lower()
-                mime_map = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
-                mime_type = mime_map.get(ext, "image/png")
-
-                reference_images.append(ImageContent(
-                    data=img_data,
-                    mime_type=mime_type,
-                    is_base64=True
-                ))
-                print(f"[MangaGenerator] Loaded reference: {filename}")
+                reference_images.append(await self._load_image_content(img_path))
+                log.debug("Loaded reference: %s", filename)
             except Exception as e:
-                print(f"[MangaGenerator] Failed to load kumomo ref image {img_path}: {e}")
+                log.warning("Failed to load kumomo ref image %s: %s", img_path, e)
+                all_loaded = False
 
-        return reference_images
+        # 有图片加载失败时不缓存，下次再尝试
+        if all_loaded:
+            self._kumomo_ref_sets[required] = reference_images
+        return list(reference_images)
 
     async def _save_final_manga(
         self,
         storyboard: Storyboard,
-        panels: List[GeneratedPanel],
+        final_manga: GeneratedManga,
         progress_dir: Path,
         safe_title: str,
         session_id: str
     ):
         """保存最终生成的漫画和分镜脚本"""
-        import json
-
         try:
-            final_manga = GeneratedManga(
-                title=storyboard.title,
-                panels=panels,
-                character_theme=storyboard.character_theme,
-                language=storyboard.language
-            )
-
             # 保存漫画图片
             filename = f"{safe_title}_{session_id}_final.png"
             output_path = progress_dir / filename
 
-            combined = final_manga.get_combined_image()
-            with open(output_path, "wb") as f:
-                f.write(combined)
+            # 解码、拼接和 PNG 编码都是 CPU 密集操作，放到线程中执行，避免阻塞事件循环
+            await asyncio.to_thread(final_manga.save_combined_image, output_path)
 
-            print(f"[MangaGenerator] Saved final: {output_path.name}")
+            log.info("Saved final: %s", output_path.name)
 
             # 保存分镜脚本 JSON（用于验证图像生成质量）
             json_filename = f"{safe_title}_{session_id}_storyboard.json"
@@ -777,13 +1053,13 @@ Answer only: PASS or FAIL"""
             storyboard_data["session_id"] = session_id
             storyboard_data["generated_at"] = datetime.now().isoformat()
 
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump(storyboard_data, f, ensure_ascii=False, indent=2)
+            # 在线程中写入，避免阻塞事件循环
+            await asyncio.to_thread(_write_json_atomic, json_path, storyboard_data)
 
-            print(f"[MangaGenerator] Saved storyboard: {json_filename}")
+            log.info("Saved storyboard: %s", json_filename)
 
         except Exception as e:
-            print(f"[MangaGenerator] Failed to save final: {e}")
+            log.error("Failed to save final: %s", e)
 
 
 # 全局实例
@@ -3,27 +3,63 @@ PDF Parser Service
 解析 PDF 文档，提取文本和图像
 """
 
+import asyncio
+import bisect
 import io
-import base64
+import binascii
+import re
 from dataclasses import dataclass, field
+from functools import cached_property
 from pathlib import Path
 from typing import Optional, BinaryIO, Union
 
 import pdfplumber
 from PIL import Image
 
+# pybase64 提供 SIMD 加速的 base64 编码（可选依赖），未安装时使用标准库
+try:
+    import pybase64
+except ImportError:
+    pybase64 = None
+
+
+# 分块时优先在这些句子结束符处切分（按优先级排列）
+_SENTENCE_SEPARATORS = ("。", ".", "！", "!", "？", "?", "\n\n")
+# 每种分隔符的零宽前瞻模式，用于找出所有（含重叠的）出现位置
+_SEPARATOR_RES = tuple(re.compile(f"(?={re.escape(sep)})") for sep in _SENTENCE_SEPARATORS)
+
+# 提取图支持的编码格式：配置名 -> (PIL 格式名, MIME 类型)
+_IMAGE_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "jpg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "png": ("PNG", "image/png"),
+}
+
+
+def _b64encode(data) -> str:
+    """把字节（或 memoryview）编码为 base64 字符串"""
+    if pybase64 is not None:
+        return pybase64.b64encode_as_string(data)
+    return binascii.b2a_base64(data, newline=False).decode("ascii")
+
 
 @dataclass
 class ExtractedImage:
     """提取的图像"""
     page_number: int
     image_index: int
-    data_base64: str
-    mime_type: str = "image/png"
+    data: bytes                   # 编码后的原始图像字节（PNG/JPEG/WEBP）
+    mime_type: str = "image/jpeg"
     width: int = 0
     height: int = 0
     caption: str = ""
 
+    @cached_property
+    def data_base64(self) -> str:
+        """base64 形式的图像数据，只在首次访问时编码"""
+        return _b64encode(self.data)
+
 
 @dataclass
 class ExtractedPage:
@@ -42,12 +78,14 @@ class ParsedDocument:
     pages: list[ExtractedPage]
     metadata: dict = field(default_factory=dict)
 
-    @property
+    # 文档解析完成后页面不再变化，完整文本和图像列表只在首次访问时构建
+
+    @cached_property
     def full_text(self) -> str:
         """获取完整文本"""
         return "\n\n".join(page.text for page in self.pages)
 
-    @property
+    @cached_property
     def all_images(self) -> list[ExtractedImage]:
         """获取所有图像"""
         images = []
@@ -67,37 +105,81 @@ class ParsedDocument:
             文本块列表
         """
         full_text = self.full_text
+        return [
+            full_text[start:end].strip()
+            for start, end in self.get_chunk_ranges(max_tokens, overlap)
+        ]
+
+    def get_chunk_ranges(self, max_tokens: int = 4000, overlap: int = 200) -> list[tuple[int, int]]:
+        """
+        计算文本块在 full_text 中的 (起始, 结束) 偏移
+
+        每块最长 max_tokens * 4 个字符，尽量在句子边界处结束；
+        下一块从上一块结束位置回退 overlap 个字符开始，但保证每次至少前进，
+        最后一块到达文末即停止。
+        """
+        full_text = self.full_text
+        text_len = len(full_text)
         max_chars = max_tokens * 4
 
-        if len(full_text) <= max_chars:
-            return [full_text]
+        if text_len <= max_chars:
+            return [(0, text_len)]
+
+        # 一次性扫描出每种分隔符的所有位置（含重叠出现），
+        # 分块时二分查找窗口内最后一个，代替每块对每种分隔符做 rfind
+        sep_positions = [
+            (sep, [m.start() for m in sep_re.finditer(full_text)])
+            for sep, sep_re in zip(_SENTENCE_SEPARATORS, _SEPARATOR_RES)
+        ]
 
-        chunks = []
+        ranges = []
         start = 0
 
-        while start < len(full_text):
+        while start < text_len:
             end = start + max_chars
 
+            if end >= text_len:
+                ranges.append((start, text_len))
+                break
+
             # 尝试在句子边界处分割
-            if end < len(full_text):
-                # 找最近的句子结束符
-                for sep in ["。", ".", "！", "!", "？", "?", "\n\n"]:
-                    last_sep = full_text.rfind(sep, start, end)
-                    if last_sep > start:
-                        end = last_sep + 1
-                        break
+            # 找最近的句子结束符（等价于 rfind(sep, start, end)）
+            for sep, positions in sep_positions:
+                idx = bisect.bisect_right(positions, end - len(sep)) - 1
+                if idx >= 0 and positions[idx] > start:
+                    end = positions[idx] + 1
+                    break
 
-            chunks.append(full_text[start:end].strip())
-            start = end - overlap
+            ranges.append((start, end))
+            # 句子边界离窗口起点很近时，回退 overlap 会让起点原地不动甚至倒退
+            start = max(end - overlap, start + 1)
 
-        return chunks
+        return ranges
 
 
 class PDFParser:
     """PDF 解析器"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        image_format: str = "jpeg",
+        image_quality: int = 80
+    ):
         self.min_image_size = 100  # 最小图像尺寸（像素）
+        self.image_resolution = 150  # 裁剪图的渲染 DPI
+        self.max_image_dim = 2048  # 渲染后的最长边上限（像素），超大插图相应降低 DPI
+        # 提取图的编码格式 (jpeg/webp/png)：提取图只作为模型输入，默认用有损 JPEG
+        # 颜色很少的图（流程图、示意图）仍保存为 PNG，避免线条和文字出现压缩噪点
+        self.image_format = image_format.lower()
+        if self.image_format not in _IMAGE_FORMATS:
+            raise ValueError(
+                f"Unsupported image_format: {image_format!r} (expected one of {', '.join(_IMAGE_FORMATS)})"
+            )
+        self.image_quality = image_quality
+        # 并行提取页面的线程数。pdfminer 的版面分析是纯 Python、持有 GIL，
+        # 多线程还要每个线程各自重新解析整份 PDF，单核上实测反而更慢，默认单线程
+        self.max_workers = max_workers or 1
 
     async def parse(
         self,
@@ -119,23 +201,35 @@ class PDFParser:
         if isinstance(source, (str, Path)):
             path = Path(source)
             filename = path.name
+            pdf_bytes = path.read_bytes()
         else:
             filename = "uploaded.pdf"
+            pdf_bytes = source.read()
 
-        pages = []
-
-        with pdfplumber.open(source) as pdf:
-            total_pages = len(pdf.pages)
-            metadata = pdf.metadata or {}
+        if self.max_workers <= 1:
+            # 单线程：整份文档只打开一次，在一个工作线程中提取，不阻塞事件循环
+            total_pages, metadata, pages = await asyncio.to_thread(
+                self._extract_document, pdf_bytes, extract_images, extract_tables
+            )
+        else:
+            total_pages, metadata = await asyncio.to_thread(self._read_page_count, pdf_bytes)
+
+            # pdfplumber 文档对象不是线程安全的：按连续页段切分，每个线程独立打开一份文档
+            num_workers = max(1, min(self.max_workers, total_pages))
+            step = max(1, -(-total_pages // num_workers))
+            page_ranges = [
+                (start, min(start + step, total_pages))
+                for start in range(0, total_pages, step)
+            ]
 
-            for page_num, page in enumerate(pdf.pages, start=1):
-                extracted_page = await self._extract_page(
-                    page,
-                    page_num,
-                    extract_images,
-                    extract_tables
+            chunks = await asyncio.gather(*(
+                asyncio.to_thread(
+                    self._extract_page_range,
+                    pdf_bytes, start, end, extract_images, extract_tables
                 )
-                pages.append(extracted_page)
+                for start, end in page_ranges
+            ))
+            pages = [page for chunk in chunks for page in chunk]
 
         return ParsedDocument(
             filename=filename,
@@ -144,7 +238,55 @@ class PDFParser:
             metadata=metadata
         )
 
-    async def _extract_page(
+    def _extract_document(
+        self,
+        pdf_bytes: bytes,
+        extract_images: bool,
+        extract_tables: bool
+    ) -> tuple[int, dict, list[ExtractedPage]]:
+        """在工作线程中打开一次文档并提取全部页面，返回 (总页数, 元数据, 页面列表)"""
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+            pages = []
+            for page_index, page in enumerate(pdf.pages):
+                pages.append(self._extract_page(
+                    page,
+                    page_index + 1,
+                    extract_images,
+                    extract_tables
+                ))
+                # 释放页面解析缓存，避免整份文档的对象都留在内存里
+                page.close()
+            return len(pdf.pages), pdf.metadata or {}, pages
+
+    def _read_page_count(self, pdf_bytes: bytes) -> tuple[int, dict]:
+        """读取总页数和元数据，供多线程提取切分页段"""
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+            return len(pdf.pages), pdf.metadata or {}
+
+    def _extract_page_range(
+        self,
+        pdf_bytes: bytes,
+        start: int,
+        end: int,
+        extract_images: bool,
+        extract_tables: bool
+    ) -> list[ExtractedPage]:
+        """在工作线程中提取第 start 到 end-1 页（从 0 计数）"""
+        pages = []
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+            for page_index in range(start, end):
+                page = pdf.pages[page_index]
+                pages.append(self._extract_page(
+                    page,
+                    page_index + 1,
+                    extract_images,
+                    extract_tables
+                ))
+                # 释放页面解析缓存，避免整份文档的对象都留在内存里
+                page.close()
+        return pages
+
+    def _extract_page(
         self,
         page,
         page_number: int,
@@ -158,14 +300,15 @@ class PDFParser:
         # 提取图像
         images = []
         if extract_images:
-            images = await self._extract_images(page, page_number)
+            images = self._extract_images(page, page_number)
 
         # 提取表格
         tables = []
         if extract_tables:
             raw_tables = page.extract_tables() or []
+            # 空单元格为 None，统一成 ""；大多数行没有空单元格，原样复用
             tables = [
-                [[cell or "" for cell in row] for row in table]
+                [row if None not in row else [cell or "" for cell in row] for row in table]
                 for table in raw_tables
             ]
 
@@ -176,7 +319,7 @@ class PDFParser:
             tables=tables
         )
 
-    async def _extract_images(
+    def _extract_images(
         self,
         page,
         page_number: int
@@ -204,18 +347,24 @@ class PDFParser:
                 x1 = img_info.get("x1", width)
                 y1 = img_info.get("bottom", height)
 
-                # 裁剪页面获取图像区域
-                cropped = page.within_bbox((x0, y0, x1, y1))
+                # 整页插图直接渲染页面，否则裁剪出图像区域
+                bbox = (x0, y0, x1, y1)
+                cropped = page if bbox == tuple(page.bbox) else page.within_bbox(bbox)
                 if cropped:
-                    img_page = cropped.to_image(resolution=150)
+                    # width/height 是页面上的尺寸（1/72 英寸），按最长边限制渲染 DPI
+                    resolution = min(
+                        self.image_resolution,
+                        72 * self.max_image_dim / max(width, height)
+                    )
+                    img_page = cropped.to_image(resolution=resolution)
                     img_buffer = io.BytesIO()
-                    img_page.original.save(img_buffer, format="PNG")
-                    img_data = base64.b64encode(img_buffer.getvalue()).decode()
+                    mime_type = self._encode_image(img_page.original, img_buffer)
 
                     images.append(ExtractedImage(
                         page_number=page_number,
                         image_index=idx,
-                        data_base64=img_data,
+                        data=img_buffer.getvalue(),
+                        mime_type=mime_type,
                         width=width,
                         height=height
                     ))
@@ -226,6 +375,24 @@ class PDFParser:
 
         return images
 
+    def _encode_image(self, img: Image.Image, buffer: io.BytesIO) -> str:
+        """按配置格式编码提取图，返回 MIME 类型"""
+        fmt = self.image_format
+        # 少于 256 种颜色的图视为示意图，保留无损 PNG
+        if fmt != "png" and img.getcolors(256) is not None:
+            fmt = "png"
+
+        pil_format, mime_type = _IMAGE_FORMATS[fmt]
+        if fmt == "png":
+            # 提取图只作为模型输入，体积不敏感，用最快的压缩级别
+            img.save(buffer, format=pil_format, compress_level=1)
+        else:
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            img.save(buffer, format=pil_format, quality=self.image_quality)
+
+        return mime_type
+
     async def extract_figure_with_context(
         self,
         document: ParsedDocument,
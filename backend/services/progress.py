@@ -2,19 +2,20 @@
 Progress Tracking for Manga Generation
 """
 
+import time
 from dataclasses import dataclass
 from typing import Optional
-from datetime import datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class GenerationProgress:
     """Current generation progress"""
     stage: str = "idle"  # idle, storyboard, generating, completed, error
     current_panel: int = 0
     total_panels: int = 0
     message: str = ""
-    started_at: Optional[datetime] = None
+    progress_percent: int = 0  # 在 set_panel_progress 时计算，轮询时直接读取
+    started_at: Optional[float] = None  # time.monotonic()，只用于计算耗时
 
     def to_dict(self) -> dict:
         return {
@@ -22,7 +23,7 @@ class GenerationProgress:
             "current_panel": self.current_panel,
             "total_panels": self.total_panels,
             "message": self.message,
-            "progress_percent": round(self.current_panel / self.total_panels * 100) if self.total_panels > 0 else 0
+            "progress_percent": self.progress_percent
         }
 
 
@@ -38,10 +39,11 @@ def get_progress() -> GenerationProgress:
 def set_stage(stage: str, message: str = ""):
     """Set current stage"""
     global _progress
+    # 只在进入 generating 阶段时记录开始时间，生成过程中的状态消息更新不重置计时
+    if stage == "generating" and _progress.stage != "generating":
+        _progress.started_at = time.monotonic()
     _progress.stage = stage
     _progress.message = message
-    if stage == "generating":
-        _progress.started_at = datetime.now()
 
 
 def set_panel_progress(current: int, total: int):
@@ -49,6 +51,7 @@ def set_panel_progress(current: int, total: int):
     global _progress
     _progress.current_panel = current
     _progress.total_panels = total
+    _progress.progress_percent = round(current / total * 100) if total > 0 else 0
 
 
 def reset_progress():
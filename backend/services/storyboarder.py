@@ -8,18 +8,229 @@ Storyboarder Service - 简化版
 3. 每个 panel 单独生成，避免长内容导致文字乱码
 """
 
+import asyncio
+import dataclasses
+import hashlib
 import json
+import logging
+import os
 import re
+import tempfile
+import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Optional, Dict, List
+from functools import lru_cache
+from typing import Optional, Dict, List, Iterator
 from pathlib import Path
 
+import yaml
+
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from engines import get_client, GenerationConfig, ImageContent
-from config_loader import get_config
+from config_loader import get_config, CONFIG_DIR, PROJECT_ROOT
+
+# orjson 解析更快（可选依赖），未安装时使用标准库；
+# orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，异常处理无需区分
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# PyYAML 编译了 libyaml 时使用 C 解析器，行为与 SafeLoader 相同
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+log = logging.getLogger("Storyboarder")
+char_log = logging.getLogger("CharacterLibrary")
+
+
+# ---- 预编译的正则（分镜解析会对每个 panel 段落反复使用）----
+
+# _fix_json: 尾逗号、缺失的逗号
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_OBJ_OBJ_RE = re.compile(r'}\s*{')
+_OBJ_ARR_RE = re.compile(r'}\s*\[')
+_ARR_OBJ_RE = re.compile(r'\]\s*{')
+
+# _extract_panels_from_broken_json: {"panel_number": ... } 对象的起始位置
+_PANEL_START_RE = re.compile(r'\{\s*"panel_number"\s*:\s*\d+')
+# 括号配对扫描时关心的字符：转义序列整体吞掉，避免 \" 被当成字符串结束
+_JSON_STRUCT_RE = re.compile(r'\\.|[{}"]', re.DOTALL)
+
+# _parse_response: ```json 代码块
+_JSON_BLOCK_RE = re.compile(r'```json\s*(.*?)\s*```', re.DOTALL)
+
+# _parse_natural_language_format: 自然语言分镜的各个字段
+_SECTION_SPLIT_RE = re.compile(r'={3,}')
+_PANEL_HEADER_RE = re.compile(r'(?:Panel|分镜)\s*(\d+)(?:\s*[:：]\s*(.+?))?(?:\n|$)', re.IGNORECASE)
+_CHARACTERS_RE = re.compile(r'(?:Characters|角色):\s*(.+?)(?:\n|$)', re.IGNORECASE)
+_CHAR_SPLIT_RE = re.compile(r'[,，、]')
+_SCENE_RE = re.compile(r'(?:Scene|场景):\s*(.+?)(?:\n|$)', re.IGNORECASE)
+# 多行字段只匹配标签，字段结束位置用下一个字段标签单独查找一次（见 _field_block），
+# 避免惰性匹配在每个字符处都尝试前瞻；段落已按 === 切分，段内不会再出现 ===
+_VISUAL_LABEL_RE = re.compile(r'(?:Visual|画面|画面内容):\s*', re.IGNORECASE)
+_VISUAL_END_RE = re.compile(r'\n(?:Dialogue|对白|Narration|旁白):', re.IGNORECASE)
+_DIALOGUE_LABEL_RE = re.compile(r'(?:Dialogue|对白):\s*', re.IGNORECASE)
+_DIALOGUE_END_RE = re.compile(r'\n(?:Narration|旁白):', re.IGNORECASE)
+# Only match double quotes to avoid cutting at apostrophes (don't, aren't, etc.)
+_DIALOGUE_LINE_RE = re.compile(r'-\s*(\w+):\s*"([^"]+)"')
+_DIALOGUE_LINE_CURLY_RE = re.compile(r'-\s*(\w+):\s*\u201c([^\u201d]+)\u201d')
+_NARRATION_RE = re.compile(r'(?:Narration|旁白|原理解释):\s*(.+)', re.DOTALL | re.IGNORECASE)
+
+# 技术解读 prompt 的固定指令部分（论文正文拼接在其后），各篇论文逐字节相同
+_ANALYSIS_PROMPT_PREFIX = """Analyze this academic paper. Extract ALL key information:
+- Research question and novelty
+- Methodology (exact steps, algorithms, parameters)
+- Results (exact numbers, statistics, comparisons)
+- Conclusions and limitations
+
+Copy exact values from the paper. Output in English.
+
+# Paper
+"""
+
+# 论文正文 / 技术解读写入 prompt 的最大字符数（论文超出 ANALYSIS_MAX_CHARS 时分段解读）
+ANALYSIS_MAX_CHARS = 80000
+STORYBOARD_MAX_CHARS = 100000
+
+
+def _split_for_analysis(text: str) -> List[str]:
+    """
+    把超过 ANALYSIS_MAX_CHARS 的论文切成长度相近的几段（尽量在段落/换行处断开）
+
+    每段不超过 ANALYSIS_MAX_CHARS，未超长时原样返回单段
+    """
+    if len(text) <= ANALYSIS_MAX_CHARS:
+        return [text]
+
+    parts = -(-len(text) // ANALYSIS_MAX_CHARS)
+    target = -(-len(text) // parts)
+    chunks = []
+    start = 0
+    while len(text) - start > ANALYSIS_MAX_CHARS:
+        end = start + target
+        cut = text.rfind("\n\n", start + target // 2, end)
+        if cut == -1:
+            cut = text.rfind("\n", start + target // 2, end)
+        if cut == -1:
+            cut = end
+        chunks.append(text[start:cut])
+        start = cut
+    chunks.append(text[start:])
+    return chunks
+
+
+def _join_analyses(contents: List[str]) -> str:
+    """
+    合并分段技术解读，单段时原样返回
+
+    合起来超过 STORYBOARD_MAX_CHARS 时按段分配预算：短的段落原样保留，剩余预算由较长的段落平分，
+    超出的段落各自截短，保证 Step 2 截断时不会把后面的段落整段丢掉
+    """
+    count = len(contents)
+    if count == 1:
+        return contents[0]
+
+    # 预留每段标题和分隔符的位置；从短到长分配，用不完的预算留给更长的段落
+    remaining = STORYBOARD_MAX_CHARS - 32 * count
+    limits = [0] * count
+    for n, i in enumerate(sorted(range(count), key=lambda i: len(contents[i]))):
+        limits[i] = min(len(contents[i]), remaining // (count - n))
+        remaining -= limits[i]
+
+    parts = []
+    for i, content in enumerate(contents):
+        if len(content) > limits[i]:
+            log.warning("Analysis part %s/%s: %s chars, trimmed to %s", i + 1, count, len(content), limits[i])
+            content = _truncate_at_break(content, limits[i], _ANALYSIS_BREAKS)
+        parts.append(f"## Part {i + 1}/{count}\n{content}")
+    return "\n\n".join(parts)
+
+
+# 角色参考图目录与角色配置文件
+CHARACTER_IMAGES_DIR = CONFIG_DIR / "character_images"
+CHARACTERS_CONFIG_PATH = CONFIG_DIR / "characters.yaml"
+
+# 角色图片文件名 "数字. 角色名"
+_CHAR_IMAGE_NAME_RE = re.compile(r'^(\d+)\.\s*(.+)$')
+
+# 已解析的角色配置 {(路径, mtime_ns, 文件大小): characters}，文件被修改后自动重新解析
+_CHARACTER_CONFIG_CACHE: Dict[tuple, dict] = {}
+
+
+# 超长对白/旁白的截断点，按优先级排列（句末标点优先于逗号和空格）
+_DIALOGUE_BREAKS = ('。', '！', '？', '，', '.', '!', '?', ',', ' ')
+_NARRATION_BREAKS = ('。', '！', '？', '.', '!', '?', ' ')
+# 分段技术解读超出预算时的截断点（优先在换行处断开）
+_ANALYSIS_BREAKS = ('\n', '。', '.', ' ')
+
+
+def _truncate_at_break(text: str, limit: int, breaks: tuple) -> str:
+    """
+    截断到 limit 个字符以内，尽量在标点或空格处断开
+
+    按 breaks 的优先级取第一个位置超过 60% 的断点（保留断点字符），没有合适断点时加省略号
+    """
+    truncated = text[:limit]
+    min_pos = limit * 0.6
+    for punct in breaks:
+        last_punct = truncated.rfind(punct)
+        if last_punct > min_pos:
+            return truncated[:last_punct + 1]
+    return truncated + "..."
+
+
+def _field_block(section: str, label_re: re.Pattern, end_re: re.Pattern) -> Optional[str]:
+    """
+    取出 section 中 label_re 标签之后、end_re（下一个字段标签）之前的内容
+
+    字段内容至少一个字符；没有后续字段时取到段落末尾
+    """
+    label = label_re.search(section)
+    if label is None or label.end() >= len(section):
+        return None
+    start = label.end()
+    end = end_re.search(section, start + 1)
+    return section[start:end.start() if end else len(section)]
+
+
+def _iter_panel_objects(text: str) -> Iterator[str]:
+    """
+    从（可能损坏的）JSON 文本中截取每个 {"panel_number": ...} 对象
+
+    单遍括号配对扫描（跳过字符串内的括号），只在结构字符间跳转；
+    未闭合的 panel 对象直接丢弃，不影响后面的 panel。
+    """
+    first = _PANEL_START_RE.search(text)
+    if first is None:
+        return
+
+    # 栈中记录每个未闭合 '{' 的位置，-1 表示不是 panel 起点
+    stack: List[int] = []
+    last_end = 0
+    in_str = False
+    for token in _JSON_STRUCT_RE.finditer(text, first.start()):
+        c = token.group()
+        if in_str:
+            if c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == "{":
+            start = token.start()
+            stack.append(start if _PANEL_START_RE.match(text, start) else -1)
+        elif c == "}" and stack:
+            start = stack.pop()
+            if start >= last_end:
+                last_end = token.end()
+                yield text[start:last_end]
 
 
 class PanelType(str, Enum):
@@ -43,41 +254,42 @@ class PanelType(str, Enum):
     OTHER = "other"  # 通用类型
 
     @classmethod
+    @lru_cache(maxsize=128)
     def from_string(cls, value: str) -> "PanelType":
         """灵活解析 panel_type，未知类型映射到 OTHER"""
         value = value.lower().strip()
         # 直接匹配
-        for member in cls:
-            if member.value == value:
+        member = _PANEL_TYPE_BY_VALUE.get(value)
+        if member is not None:
+            return member
+        # 部分匹配（按优先级）
+        for keyword, member in _PANEL_TYPE_KEYWORDS:
+            if keyword in value:
                 return member
-        # 部分匹配
-        if "intro" in value or "title" in value:
-            return cls.INTRODUCTION
-        if "explain" in value or "concept" in value or "detail" in value:
-            return cls.EXPLANATION
-        if "example" in value or "analogy" in value:
-            return cls.EXAMPLE
-        if "react" in value or "emotion" in value:
-            return cls.REACTION
-        if "conclu" in value or "summary" in value or "ending" in value:
-            return cls.CONCLUSION
-        if "action" in value or "moment" in value:
-            return cls.ACTION
-        if "transition" in value or "shift" in value:
-            return cls.TRANSITION
-        if "metaphor" in value:
-            return cls.METAPHOR
-        if "method" in value:
-            return cls.METHODOLOGY
-        if "discov" in value or "reveal" in value:
-            return cls.DISCOVERY
-        if "humor" in value or "gag" in value or "chaos" in value:
-            return cls.HUMOR
         # 默认返回 OTHER
         return cls.OTHER
 
 
-@dataclass
+# panel_type 值 -> 枚举成员
+_PANEL_TYPE_BY_VALUE = {member.value: member for member in PanelType}
+
+# 部分匹配关键词 -> 面板类型（按优先级排列）
+_PANEL_TYPE_KEYWORDS = (
+    ("intro", PanelType.INTRODUCTION), ("title", PanelType.INTRODUCTION),
+    ("explain", PanelType.EXPLANATION), ("concept", PanelType.EXPLANATION), ("detail", PanelType.EXPLANATION),
+    ("example", PanelType.EXAMPLE), ("analogy", PanelType.EXAMPLE),
+    ("react", PanelType.REACTION), ("emotion", PanelType.REACTION),
+    ("conclu", PanelType.CONCLUSION), ("summary", PanelType.CONCLUSION), ("ending", PanelType.CONCLUSION),
+    ("action", PanelType.ACTION), ("moment", PanelType.ACTION),
+    ("transition", PanelType.TRANSITION), ("shift", PanelType.TRANSITION),
+    ("metaphor", PanelType.METAPHOR),
+    ("method", PanelType.METHODOLOGY),
+    ("discov", PanelType.DISCOVERY), ("reveal", PanelType.DISCOVERY),
+    ("humor", PanelType.HUMOR), ("gag", PanelType.HUMOR), ("chaos", PanelType.HUMOR),
+)
+
+
+@dataclass(slots=True)
 class Panel:
     """单个漫画格"""
     panel_number: int
@@ -94,7 +306,7 @@ class Panel:
     layout_hint: str = "normal"
 
 
-@dataclass
+@dataclass(slots=True)
 class Storyboard:
     """完整分镜脚本"""
     title: str
@@ -143,7 +355,11 @@ class Storyboarder:
     def __init__(self, character_theme: str = "chiikawa"):
         self.character_theme = character_theme
         self.config = get_config()
-        self.char_lib = CharacterLibrary()  # 动态加载原创角色
+        self.char_lib = get_character_library()  # 动态加载原创角色
+        # 角色参考图（base64）只读取一次，主题不变则内容不变
+        self._reference_images: Optional[List[ImageContent]] = None
+        # 分镜 prompt 的固定前缀，同样只取决于主题
+        self._storyboard_prompt_prefix: Optional[str] = None
 
     async def generate_storyboard(
         self,
@@ -158,75 +374,83 @@ class Storyboarder:
         Step 2: 用英文生成高质量漫画分镜
         Step 3: 翻译对白到目标语言（如果不是英文）
         """
-        import hashlib
-
         # 验证输入
         if not text or len(text) < 100:
             raise ValueError(f"Input text too short ({len(text)} chars). PDF may not have been parsed correctly.")
 
-        text_hash = hashlib.sha256(text.encode()).hexdigest()[:16]
-        cache_key = f"v{CACHE_VERSION}_{text_hash}_{language}_{self.character_theme}"
-        print(f"[Storyboarder] Input: {len(text)} chars, hash={text_hash}, title={title}")
+        text_hash, cache_key = self._cache_key(text, title, language)
+        log.info("Input: %s chars, hash=%s, title=%s", len(text), text_hash, title)
 
-        # 检查缓存
-        if cache_key in _storyboard_cache:
-            print(f"[Storyboarder] Using cached storyboard for {cache_key}")
-            return _storyboard_cache[cache_key]
+        # 检查缓存（内存 -> 磁盘）
+        cached = await _get_cached_storyboard(cache_key)
+        if cached is not None:
+            return cached
 
-        print(f"[Storyboarder] Cache miss, generating new storyboard...")
+        log.info("Cache miss, generating new storyboard")
 
         client = await get_client()
 
-        # ========== Step 1: 生成英文技术解读 ==========
-        print(f"[Storyboarder] Step 1: Generating technical analysis ({len(text)} chars)...")
-
-        analysis_prompt = self._build_analysis_prompt(text, title)
-
-        config = GenerationConfig(
-            temperature=0.3,  # 低温度确保准确性
-            max_tokens=32000  # 足够生成完整技术分析
-        )
+        # 参考图读取与编码在线程中进行，与 Step 1 的模型请求重叠
+        reference_task = asyncio.ensure_future(asyncio.to_thread(self._load_character_reference_images))
 
-        analysis_response = await client.generate_text(
-            prompt=analysis_prompt,
-            config=config
-        )
-
-        technical_analysis = analysis_response.content
-        print(f"[Storyboarder] Analysis: {len(technical_analysis)} chars")
+        # ========== Step 1: 生成英文技术解读 ==========
+        skip_under = self.config.manga_settings.skip_analysis_under_chars
+        if len(text) < skip_under:
+            # 短文本模型可以直接读懂，原文直接作为 Step 2 的输入，省去一次往返
+            log.info("Step 1: Skipped for short input (%s < %s chars)", len(text), skip_under)
+            technical_analysis = text
+        else:
+            # 超长论文分段并发解读，避免超出 ANALYSIS_MAX_CHARS 的内容被截掉
+            analysis_prompts = self._build_analysis_prompts(text, title)
+            log.info("Step 1: Generating technical analysis (%s chars, %s part(s))", len(text), len(analysis_prompts))
+
+            semaphore = asyncio.Semaphore(ANALYSIS_MAX_CONCURRENCY)
+
+            async def analyze_part(prompt: str) -> str:
+                # 各段解读按 prompt 缓存：同一篇论文换语言、或配置变化后重新生成分镜时不必重新解读
+                part_key = hashlib.sha256(prompt.encode()).hexdigest()
+                cached_part = _analysis_cache.get(part_key)
+                if cached_part is not None:
+                    _analysis_cache.move_to_end(part_key)
+                    return cached_part
+                async with semaphore:
+                    response = await client.generate_text(prompt=prompt, config=_ANALYSIS_CONFIG)
+                if response.content:
+                    _remember_analysis(part_key, response.content)
+                return response.content
+
+            technical_analysis = _join_analyses(
+                await asyncio.gather(*(analyze_part(prompt) for prompt in analysis_prompts))
+            )
+            log.info("Analysis: %s chars", len(technical_analysis))
 
         # ========== Step 2: 用英文生成高质量漫画分镜 ==========
-        print(f"[Storyboarder] Step 2: Generating manga storyboard (in English for quality)...")
+        log.info("Step 2: Generating manga storyboard (in English for quality)")
 
         # 始终用英文生成分镜，确保最高质量
         storyboard_prompt = self._build_storyboard_prompt(technical_analysis, title, "en-US")
 
         # 加载角色参考图片（用于原创角色如 kumomo）
-        reference_images = self._load_character_reference_images()
+        reference_images = await reference_task
         if reference_images:
-            print(f"[Storyboarder] Including {len(reference_images)} character reference images")
-
-        config = GenerationConfig(
-            temperature=0.7,
-            max_tokens=32000  # 足够生成 100+ 个分镜
-        )
+            log.debug("Including %s character reference images", len(reference_images))
 
         response = await client.generate_text(
             prompt=storyboard_prompt,
             images=reference_images if reference_images else None,
-            config=config
+            config=_STORYBOARD_CONFIG
         )
 
         # 解析响应（暂时设为英文）
         storyboard = self._parse_response(response.content, title, text, "en-US")
 
-        print(f"[Storyboarder] Generated {len(storyboard.panels)} panels")
+        log.info("Generated %s panels", len(storyboard.panels))
 
         # ========== Step 3: 翻译对白到目标语言 ==========
         if language != "en-US":
-            print(f"[Storyboarder] Step 3: Translating dialogues to {language}...")
+            log.info("Step 3: Translating dialogues to %s", language)
             storyboard = await self._translate_storyboard(storyboard, language, client, technical_analysis)
-            print(f"[Storyboarder] Translation completed")
+            log.info("Translation completed")
 
         storyboard.language = language
 
@@ -238,13 +462,53 @@ class Storyboarder:
         min_panels_to_cache = 10
 
         if len(storyboard.panels) >= min_panels_to_cache and not is_fallback:
-            _storyboard_cache[cache_key] = storyboard
-            print(f"[Storyboarder] Cached storyboard as {cache_key} ({len(storyboard.panels)} panels)")
+            # 同时写入磁盘缓存，进程重启后仍可命中
+            await _cache_storyboard(cache_key, storyboard)
+            log.info("Cached storyboard as %s (%s panels)", cache_key, len(storyboard.panels))
         else:
-            print(f"[Storyboarder] NOT caching: {len(storyboard.panels)} panels (min={min_panels_to_cache}), fallback={is_fallback}")
+            log.info("NOT caching: %s panels (min=%s), fallback=%s", len(storyboard.panels), min_panels_to_cache, is_fallback)
 
         return storyboard
 
+    def _cache_key(self, text: str, title: str, language: str) -> tuple:
+        """
+        返回 (文本哈希, 缓存键)
+
+        对全文及所有影响生成结果的字段做一次增量哈希（字段间以 \\0 分隔），
+        标题也会进入 prompt，因此同一文本不同标题不共用缓存。
+        全文先折叠空白，重新解析/OCR 只导致换行、空格不同的同一篇论文也能命中；
+        角色设定等配置的指纹也计入键中，配置变化后旧缓存（包括磁盘上的）不再命中
+        """
+        h = hashlib.sha256(" ".join(text.split()).encode())
+        for value in (title or "", language, self.character_theme, self._config_fingerprint()):
+            h.update(b"\0")
+            h.update(value.encode())
+        digest = h.hexdigest()[:32]
+        return digest[:16], f"v{CACHE_VERSION}_{digest}"
+
+    def _config_fingerprint(self) -> str:
+        """
+        影响分镜结果的配置指纹
+
+        包含分镜 prompt 前缀（主题与角色设定）、跳过技术解读的阈值，
+        以及 characters.yaml 和参考图的修改时间与大小
+        """
+        if self._storyboard_prompt_prefix is None:
+            self._storyboard_prompt_prefix = self._build_storyboard_prompt_prefix()
+        parts = [self._storyboard_prompt_prefix, str(self.config.manga_settings.skip_analysis_under_chars)]
+
+        paths = [str(CHARACTERS_CONFIG_PATH)]
+        if self.character_theme == "kumomo":
+            paths.extend(self.char_lib.get_all_kumomo_reference_images())
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                parts.append(f"{path}:{stat.st_mtime_ns}:{stat.st_size}")
+            except OSError:
+                parts.append(f"{path}:missing")
+
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()[:16]
+
     async def _translate_storyboard(
         self,
         storyboard: Storyboard,
@@ -255,6 +519,9 @@ class Storyboarder:
         """
         翻译分镜到目标语言（对白 + 旁白）
         包含技术分析作为上下文，确保专业术语翻译准确
+
+        待翻译文本按 TRANSLATION_CHUNK_LINES 行分段并发翻译，
+        翻译耗时主要由输出长度决定，分段后总耗时约等于最长一段的耗时
         """
         lang_map = {"zh-CN": "Simplified Chinese", "ja-JP": "Japanese"}
         target_lang_name = lang_map.get(target_language, target_language)
@@ -280,13 +547,40 @@ class Storyboarder:
         if not all_texts:
             return storyboard
 
-        # 批量翻译
-        texts_to_translate = "\n".join(all_texts)
-
         # 包含技术分析摘要作为上下文
         context_summary = technical_analysis[:8000] if technical_analysis else ""
 
-        prompt = f"""You are translating a manga storyboard about a scientific paper to {target_lang_name}.
+        prompts = [
+            self._build_translation_prompt(
+                all_texts[i:i + TRANSLATION_CHUNK_LINES], target_lang_name, context_summary
+            )
+            for i in range(0, len(all_texts), TRANSLATION_CHUNK_LINES)
+        ]
+        log.info("Translating %s texts in %s parallel request(s)", len(all_texts), len(prompts))
+
+        semaphore = asyncio.Semaphore(TRANSLATION_MAX_CONCURRENCY)
+
+        async def translate_chunk(prompt: str):
+            async with semaphore:
+                return await client.generate_text(prompt=prompt, config=_TRANSLATION_CONFIG)
+
+        # 任一分段失败即整体失败：部分翻译的分镜会被缓存，不能静默吞掉
+        responses = await asyncio.gather(*(translate_chunk(prompt) for prompt in prompts))
+
+        log.debug("Translation response length: %s chars", sum(len(r.content) for r in responses))
+
+        return self._apply_translations(storyboard, [r.content for r in responses])
+
+    def _build_translation_prompt(
+        self,
+        texts: List[str],
+        target_lang_name: str,
+        context_summary: str
+    ) -> str:
+        """构建翻译 prompt（上下文和规则在前、待译文本在后，各分段的前缀完全相同）"""
+        texts_to_translate = "\n".join(texts)
+
+        return f"""You are translating a manga storyboard about a scientific paper to {target_lang_name}.
 
 # CONTEXT (Technical Analysis of the Paper)
 {context_summary}
@@ -312,47 +606,37 @@ Types:
 
 # OUTPUT (translations only, same format):"""
 
-        config = GenerationConfig(
-            temperature=0.3,
-            max_tokens=32000  # 足够翻译所有内容
-        )
-
-        response = await client.generate_text(
-            prompt=prompt,
-            config=config
-        )
-
-        print(f"[Storyboarder] Translation response length: {len(response.content)} chars")
-
-        # 解析翻译结果
+    def _apply_translations(self, storyboard: Storyboard, contents: List[str]) -> Storyboard:
+        """解析各分段的翻译结果并写回分镜"""
         translated_dialogues = {}  # {panel_num: {char: text}}
         translated_narrations = {}  # {panel_num: text}
         translated_title = None
 
-        for line in response.content.strip().split("\n"):
-            line = line.strip()
-            if not line or "|" not in line:
-                continue
-            parts = line.split("|", 3)
-            if len(parts) >= 4:
-                try:
-                    panel_num = int(parts[0])
-                    text_type = parts[1].strip().lower()
-                    key = parts[2].strip().lower()
-                    translated = parts[3].strip()
-
-                    if text_type == "dialogue":
-                        if panel_num not in translated_dialogues:
-                            translated_dialogues[panel_num] = {}
-                        translated_dialogues[panel_num][key] = translated
-                    elif text_type == "narration":
-                        translated_narrations[panel_num] = translated
-                    elif text_type == "title" and panel_num == 0:
-                        translated_title = translated
-                except ValueError:
+        for content in contents:
+            for line in content.strip().split("\n"):
+                line = line.strip()
+                if not line or "|" not in line:
                     continue
-
-        print(f"[Storyboarder] Parsed: {len(translated_dialogues)} dialogue panels, {len(translated_narrations)} narrations")
+                parts = line.split("|", 3)
+                if len(parts) >= 4:
+                    try:
+                        panel_num = int(parts[0])
+                        text_type = parts[1].strip().lower()
+                        key = parts[2].strip().lower()
+                        translated = parts[3].strip()
+
+                        if text_type == "dialogue":
+                            if panel_num not in translated_dialogues:
+                                translated_dialogues[panel_num] = {}
+                            translated_dialogues[panel_num][key] = translated
+                        elif text_type == "narration":
+                            translated_narrations[panel_num] = translated
+                        elif text_type == "title" and panel_num == 0:
+                            translated_title = translated
+                    except ValueError:
+                        continue
+
+        log.debug("Parsed: %s dialogue panels, %s narrations", len(translated_dialogues), len(translated_narrations))
 
         # 应用翻译
         dialogue_count = 0
@@ -361,16 +645,15 @@ Types:
         # 翻译标题
         if translated_title:
             storyboard.title = translated_title
-            print(f"[Storyboarder] Translated title: {translated_title[:50]}...")
+            log.debug("Translated title: %s", translated_title[:50])
 
         for panel in storyboard.panels:
             # 应用对白翻译
             if panel.panel_number in translated_dialogues:
-                dialogue_lower_map = {k.lower(): k for k in panel.dialogue.keys()}
+                # 解析阶段已把对白的角色名统一为小写
                 for char, translated in translated_dialogues[panel.panel_number].items():
-                    if char in dialogue_lower_map:
-                        original_key = dialogue_lower_map[char]
-                        panel.dialogue[original_key] = translated
+                    if char in panel.dialogue:
+                        panel.dialogue[char] = translated
                         dialogue_count += 1
 
             # 应用旁白翻译
@@ -378,7 +661,7 @@ Types:
                 panel.narration = translated_narrations[panel.panel_number]
                 narration_count += 1
 
-        print(f"[Storyboarder] Applied {dialogue_count} dialogues, {narration_count} narrations")
+        log.info("Applied %s dialogues, %s narrations", dialogue_count, narration_count)
 
         return storyboard
 
@@ -402,38 +685,20 @@ Types:
 
         for panel in storyboard.panels:
             # 截断对话
-            for char, text in list(panel.dialogue.items()):
+            for char, text in panel.dialogue.items():
                 if len(text) > dialogue_limit:
-                    # 智能截断：在标点或空格处截断
-                    truncated = text[:dialogue_limit]
-                    # 尝试在最后一个标点处截断
-                    for punct in ['。', '！', '？', '，', '.', '!', '?', ',', ' ']:
-                        last_punct = truncated.rfind(punct)
-                        if last_punct > dialogue_limit * 0.6:  # 至少保留 60% 内容
-                            truncated = truncated[:last_punct + 1]
-                            break
-                    else:
-                        truncated = truncated + "..."
-
-                    panel.dialogue[char] = truncated
+                    # 智能截断：在标点或空格处截断（只替换已有键的值，可在遍历中修改）
+                    panel.dialogue[char] = _truncate_at_break(text, dialogue_limit, _DIALOGUE_BREAKS)
                     truncated_count += 1
 
             # 截断旁白
             narration = getattr(panel, 'narration', '') or ''
             if len(narration) > narration_limit:
-                truncated = narration[:narration_limit]
-                for punct in ['。', '！', '？', '.', '!', '?', ' ']:
-                    last_punct = truncated.rfind(punct)
-                    if last_punct > narration_limit * 0.6:
-                        truncated = truncated[:last_punct + 1]
-                        break
-                else:
-                    truncated = truncated + "..."
-                panel.narration = truncated
+                panel.narration = _truncate_at_break(narration, narration_limit, _NARRATION_BREAKS)
                 truncated_count += 1
 
         if truncated_count > 0:
-            print(f"[Storyboarder] Truncated {truncated_count} dialogues/narrations to fit limits")
+            log.info("Truncated %s dialogues/narrations to fit limits", truncated_count)
 
         return storyboard
 
@@ -441,62 +706,56 @@ Types:
         """
         加载角色参考图片（用于原创角色）
 
-        目前支持 kumomo 主题的原创角色
+        目前支持 kumomo 主题的原创角色，结果按实例缓存
         """
-        import base64
+        if self._reference_images is not None:
+            return self._reference_images
 
         images = []
-        image_base_path = Path(__file__).parent.parent.parent / "config" / "character_images"
 
         if self.character_theme == "kumomo":
-            # 动态加载原创角色参考图
-            char_images = self.char_lib.kumomo_images_ordered
-
-            for char_name, filename in char_images:
-                img_path = image_base_path / filename
-                if img_path.exists():
-                    try:
-                        with open(img_path, "rb") as f:
-                            img_data = f.read()
-                        img_base64 = base64.b64encode(img_data).decode()
-
-                        # 确定 MIME 类型
-                        suffix = img_path.suffix.lower()
-                        mime_type = "image/jpeg" if suffix in [".jpg", ".jpeg"] else "image/png"
-
-                        images.append(ImageContent(
-                            data=img_base64,
-                            mime_type=mime_type
-                        ))
-                        print(f"[Storyboarder] Loaded reference image for {char_name}")
-                    except Exception as e:
-                        print(f"[Storyboarder] Failed to load {char_name} image: {e}")
+            # 动态加载原创角色参考图（路径在角色库扫描目录时已确认存在）
+            for img_path in self.char_lib.get_all_kumomo_reference_images():
+                try:
+                    images.append(ImageContent.from_file(img_path))
+                    log.debug("Loaded reference image %s", img_path)
+                except Exception as e:
+                    log.warning("Failed to load %s: %s", img_path, e)
 
+        self._reference_images = images
         return images
 
-    def _build_analysis_prompt(self, text: str, title: str) -> str:
+    def _build_analysis_prompts(self, text: str, title: str) -> List[str]:
         """
         构建技术解读 prompt - 简洁版，让模型自由发挥
-        """
-        print(f"[Storyboarder] Analysis prompt: {len(text)} chars")
-
-        return f"""Analyze this academic paper. Extract ALL key information:
-- Research question and novelty
-- Methodology (exact steps, algorithms, parameters)
-- Results (exact numbers, statistics, comparisons)
-- Conclusions and limitations
-
-Copy exact values from the paper. Output in English.
 
-# Paper
-{text[:80000]}"""
+        超过 ANALYSIS_MAX_CHARS 的论文按段落拆成多段，每段一个 prompt
+        """
+        log.debug("Analysis prompt: %s chars", len(text))
+
+        chunks = _split_for_analysis(text)
+        if len(chunks) == 1:
+            return [_ANALYSIS_PROMPT_PREFIX + text]
+        return [
+            f"{_ANALYSIS_PROMPT_PREFIX}(Part {i} of {len(chunks)}; the other parts are analyzed separately)\n\n{chunk}"
+            for i, chunk in enumerate(chunks, 1)
+        ]
 
     def _build_storyboard_prompt(self, text: str, title: str, language: str) -> str:
         """
         构建分镜生成 prompt（始终用英文生成，后续翻译）
 
-        使用详细的剧本格式，包含完整角色设定
+        使用详细的剧本格式，包含完整角色设定。
+        固定的说明部分在前、论文内容在最后，同一主题的请求共享逐字节相同的前缀，便于服务商的前缀缓存命中
         """
+        if self._storyboard_prompt_prefix is None:
+            self._storyboard_prompt_prefix = self._build_storyboard_prompt_prefix()
+        if len(text) > STORYBOARD_MAX_CHARS:
+            log.warning("Storyboard source: %s chars, truncated to %s", len(text), STORYBOARD_MAX_CHARS)
+        return self._storyboard_prompt_prefix + text[:STORYBOARD_MAX_CHARS]
+
+    def _build_storyboard_prompt_prefix(self) -> str:
+        """构建分镜 prompt 中与论文无关的部分（只取决于角色主题）"""
         # 根据主题选择不同的角色和详细设定
         if self.character_theme == "ghibli":
             style_name = "Studio Ghibli"
@@ -548,9 +807,6 @@ Narration: The paper's novel contribution explained simply.
 CHARACTER PROFILES (use these consistently throughout):
 {characters_desc}
 
-Source material:
-{text[:100000]}
-
 Format each panel with ALL these fields:
 {example_format}
 
@@ -559,19 +815,22 @@ Requirements:
 - Dialogue: Keep each line SHORT (max 40 characters for Chinese, 100 for English). Split long explanations across multiple panels.
 - Narration: Scientific explanation as text box (max 60 characters for Chinese, 150 for English)
 - Keep characters IN CHARACTER throughout (mentor teaches, student asks, skeptic questions)
-- Use exact numbers and terms from the paper"""
+- Use exact numbers and terms from the paper
+
+Source material:
+"""
 
     def _fix_json(self, json_str: str) -> str:
         """尝试修复常见的 JSON 格式错误"""
         fixed = json_str
 
         # 移除尾部多余的逗号 (在 ] 或 } 之前)
-        fixed = re.sub(r',\s*([}\]])', r'\1', fixed)
+        fixed = _TRAILING_COMMA_RE.sub(r'\1', fixed)
 
         # 修复缺少逗号的情况 (}{ 或 }[)
-        fixed = re.sub(r'}\s*{', '},{', fixed)
-        fixed = re.sub(r'}\s*\[', '},[', fixed)
-        fixed = re.sub(r'\]\s*{', '],{', fixed)
+        fixed = _OBJ_OBJ_RE.sub('},{', fixed)
+        fixed = _OBJ_ARR_RE.sub('},[', fixed)
+        fixed = _ARR_OBJ_RE.sub('],{', fixed)
 
         # 修复未闭合的字符串 (在 } 或 ] 之前添加引号)
         # 这个比较复杂，暂时跳过
@@ -593,24 +852,21 @@ Requirements:
         """从格式错误的 JSON 中逐个提取 panel 对象"""
         panels = []
 
-        # 使用正则匹配每个 panel 对象
-        # 匹配 {"panel_number": ... } 格式的对象
-        panel_pattern = r'\{\s*"panel_number"\s*:\s*\d+[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-
-        matches = re.findall(panel_pattern, json_str, re.DOTALL)
+        # 逐个截取 panel 对象
+        matches = _iter_panel_objects(json_str)
 
         for match in matches:
             try:
                 # 清理并尝试解析单个 panel
                 cleaned = match.strip()
-                panel = json.loads(cleaned)
+                panel = _json_loads(cleaned)
                 if "panel_number" in panel:
                     panels.append(panel)
             except json.JSONDecodeError:
                 # 尝试修复单个 panel
                 try:
                     fixed = self._fix_json(match)
-                    panel = json.loads(fixed)
+                    panel = _json_loads(fixed)
                     if "panel_number" in panel:
                         panels.append(panel)
                 except:
@@ -635,18 +891,18 @@ Requirements:
         # 尝试解析自然语言格式 (=== 分隔)
         if "===" in response:
             panels = self._parse_natural_language_format(response)
-            print(f"[Storyboarder] Parsed {len(panels)} panels from natural language format")
+            log.info("Parsed %s panels from natural language format", len(panels))
 
         # 回退: 尝试 JSON 格式
         if not panels:
-            json_match = re.search(r'```json\s*(.*?)\s*```', response, re.DOTALL)
+            json_match = _JSON_BLOCK_RE.search(response)
             if json_match:
                 json_str = json_match.group(1)
             else:
                 json_str = response
 
             try:
-                data = json.loads(json_str)
+                data = _json_loads(json_str)
                 for p in data.get("panels", []):
                     panel = self._dict_to_panel(p, len(panels) + 1)
                     if panel:
@@ -655,7 +911,7 @@ Requirements:
                 # 尝试修复 JSON
                 try:
                     fixed_json = self._fix_json(json_str)
-                    data = json.loads(fixed_json)
+                    data = _json_loads(fixed_json)
                     for p in data.get("panels", []):
                         panel = self._dict_to_panel(p, len(panels) + 1)
                         if panel:
@@ -663,13 +919,22 @@ Requirements:
                 except:
                     pass
 
+            # 整体修复失败（例如响应被截断）时，逐个提取完整的 panel 对象
+            if not panels:
+                for p in self._extract_panels_from_broken_json(json_str):
+                    panel = self._dict_to_panel(p, len(panels) + 1)
+                    if panel:
+                        panels.append(panel)
+                if panels:
+                    log.info("Recovered %s panels from broken JSON", len(panels))
+
         if not panels:
-            print(f"[Storyboarder] All parse attempts failed, using fallback")
+            log.warning("All parse attempts failed, using fallback")
             return self._create_fallback_storyboard(title, source_text, language)
 
         # 最终排序确保故事顺序正确
         panels.sort(key=lambda p: p.panel_number)
-        print(f"[Storyboarder] Final panel order: {[p.panel_number for p in panels[:10]]}...")
+        log.debug("Final panel order: %s", [p.panel_number for p in panels[:10]])
 
         return Storyboard(
             title=title or "学习笔记",
@@ -685,7 +950,7 @@ Requirements:
         panels = []
 
         # Split by ===
-        sections = re.split(r'={3,}', response)
+        sections = _SECTION_SPLIT_RE.split(response)
 
         for section in sections:
             section = section.strip()
@@ -693,56 +958,39 @@ Requirements:
                 continue
 
             # Parse panel number and title (Panel 1: The Old Problem)
-            panel_header_match = re.search(r'(?:Panel|分镜)\s*(\d+)(?:\s*[:：]\s*(.+?))?(?:\n|$)', section, re.IGNORECASE)
+            panel_header_match = _PANEL_HEADER_RE.search(section)
             panel_number = int(panel_header_match.group(1)) if panel_header_match else len(panels) + 1
             panel_title = panel_header_match.group(2).strip() if panel_header_match and panel_header_match.group(2) else ""
 
             # Parse characters
-            chars_match = re.search(r'(?:Characters|角色):\s*(.+?)(?:\n|$)', section, re.IGNORECASE)
+            chars_match = _CHARACTERS_RE.search(section)
             characters = []
             if chars_match:
                 chars_str = chars_match.group(1)
-                characters = [c.strip().lower() for c in re.split(r'[,，、]', chars_str)]
+                characters = [c.strip().lower() for c in _CHAR_SPLIT_RE.split(chars_str)]
 
             # Parse scene (简短场景描述)
-            scene_match = re.search(r'(?:Scene|场景):\s*(.+?)(?:\n|$)', section, re.IGNORECASE)
+            scene_match = _SCENE_RE.search(section)
             background = scene_match.group(1).strip() if scene_match else "simple classroom"
 
             # Parse visual description (详细画面内容)
-            visual_match = re.search(
-                r'(?:Visual|画面|画面内容):\s*(.+?)(?=\n(?:Dialogue|对白|Narration|旁白):|\n===|$)',
-                section, re.DOTALL | re.IGNORECASE
-            )
-            visual_description = visual_match.group(1).strip() if visual_match else ""
+            visual_block = _field_block(section, _VISUAL_LABEL_RE, _VISUAL_END_RE)
+            visual_description = visual_block.strip() if visual_block else ""
 
             # Parse dialogue
             dialogue = {}
-            dialogue_section = re.search(
-                r'(?:Dialogue|对白):\s*(.+?)(?=\n(?:Narration|旁白):|\n===|$)',
-                section, re.DOTALL | re.IGNORECASE
-            )
-            if dialogue_section:
-                dialogue_text = dialogue_section.group(1)
+            dialogue_text = _field_block(section, _DIALOGUE_LABEL_RE, _DIALOGUE_END_RE)
+            if dialogue_text:
                 # Match - character: "dialogue" format
-                # Only match double quotes to avoid cutting at apostrophes (don't, aren't, etc.)
-                dialogue_matches = re.findall(
-                    r'-\s*(\w+):\s*"([^"]+)"',
-                    dialogue_text
-                )
+                dialogue_matches = _DIALOGUE_LINE_RE.findall(dialogue_text)
                 # Also try curly quotes if no matches
                 if not dialogue_matches:
-                    dialogue_matches = re.findall(
-                        r'-\s*(\w+):\s*"([^"]+)"',
-                        dialogue_text
-                    )
+                    dialogue_matches = _DIALOGUE_LINE_CURLY_RE.findall(dialogue_text)
                 for char, text in dialogue_matches:
                     dialogue[char.lower()] = text
 
             # Parse narration (旁白/原理解释)
-            narration_match = re.search(
-                r'(?:Narration|旁白|原理解释):\s*(.+?)(?=\n===|$)',
-                section, re.DOTALL | re.IGNORECASE
-            )
+            narration_match = _NARRATION_RE.search(section)
             narration = narration_match.group(1).strip() if narration_match else ""
 
             if visual_description or dialogue or narration:
@@ -769,13 +1017,18 @@ Requirements:
             panel_type_str = p.get("panel_type", "explain")
             panel_type = PanelType.from_string(panel_type_str)
 
+            # 对白的角色名统一为小写（与自然语言格式一致），翻译时可直接按键匹配
+            dialogue = p.get("dialogue", {})
+            if isinstance(dialogue, dict):
+                dialogue = {char.lower(): text for char, text in dialogue.items()}
+
             return Panel(
                 panel_number=p.get("panel_number", default_num),
                 panel_type=panel_type,
                 visual_description=p.get("visual_description", p.get("visual", "")),
                 characters=p.get("characters", self._get_default_characters()),
                 character_emotions=p.get("character_emotions", {}),
-                dialogue=p.get("dialogue", {}),
+                dialogue=dialogue,
                 narration=p.get("narration", ""),
                 panel_title=p.get("panel_title", p.get("title", "")),
                 visual_metaphor=p.get("visual_metaphor", ""),
@@ -784,7 +1037,7 @@ Requirements:
                 layout_hint=p.get("layout_hint", "normal")
             )
         except Exception as e:
-            print(f"[Storyboarder] Panel parse error: {e}")
+            log.warning("Panel parse error: %s", e)
             return None
 
     def _get_default_characters(self) -> list:
@@ -917,7 +1170,7 @@ class CharacterLibrary:
     """角色库 - 动态从 character_images 目录加载原创角色"""
 
     def __init__(self):
-        self.image_base_path = Path(__file__).parent.parent.parent / "config" / "character_images"
+        self.image_base_path = CHARACTER_IMAGES_DIR
         self._load_kumomo_characters()
         self._load_config()
 
@@ -933,35 +1186,37 @@ class CharacterLibrary:
         - 2 = 学生 (student)
         - 3 = 质疑者 (skeptic)
         """
-        import re
-
         self.kumomo_characters = {}  # name -> name
         self.kumomo_images_ordered = []  # [(name, filename), ...]
         self.kumomo_images = {}  # name -> filename
         self.kumomo_roles = {}  # name -> role
+        # 扫描时已确认存在的图片路径，查询参考图时不再访问文件系统
+        self._kumomo_paths = {}  # name -> path
+        self._kumomo_paths_ordered = []  # [path, ...]
 
         # 角色分工映射
         role_map = {1: "mentor", 2: "student", 3: "skeptic"}
 
         if not self.image_base_path.exists():
-            print(f"[CharacterLibrary] Warning: {self.image_base_path} does not exist")
+            char_log.warning("%s does not exist", self.image_base_path)
             return
 
         # 扫描目录中的图片文件
         image_extensions = {'.jpeg', '.jpg', '.png', '.webp'}
-        image_files = [
-            f for f in self.image_base_path.iterdir()
-            if f.is_file() and f.suffix.lower() in image_extensions
-        ]
+        # scandir 的目录项自带文件类型，is_file() 通常无需再 stat 每个文件
+        with os.scandir(self.image_base_path) as entries:
+            image_files = [
+                (entry.name, entry.path) for entry in entries
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in image_extensions
+            ]
 
         # 解析文件名并排序
         parsed_chars = []
-        for img_file in image_files:
-            filename = img_file.name
-            stem = img_file.stem
+        for filename, path in image_files:
+            stem = os.path.splitext(filename)[0]
 
             # 尝试解析 "数字. 角色名" 格式
-            match = re.match(r'^(\d+)\.\s*(.+)$', stem)
+            match = _CHAR_IMAGE_NAME_RE.match(stem)
             if match:
                 order = int(match.group(1))
                 char_name = match.group(2).strip().lower()
@@ -971,66 +1226,75 @@ class CharacterLibrary:
                 char_name = stem.lower()
 
             role = role_map.get(order, "character")
-            parsed_chars.append((order, char_name, filename, role))
+            parsed_chars.append((order, char_name, filename, role, path))
 
         # 按数字排序
         parsed_chars.sort(key=lambda x: x[0])
 
-        for order, char_name, filename, role in parsed_chars:
+        for order, char_name, filename, role, path in parsed_chars:
             self.kumomo_characters[char_name] = char_name
             self.kumomo_images_ordered.append((char_name, filename))
             self.kumomo_images[char_name] = filename
             self.kumomo_roles[char_name] = role
+            self._kumomo_paths[char_name] = path
+            self._kumomo_paths_ordered.append(path)
 
         char_info = [(name, self.kumomo_roles[name]) for name, _ in self.kumomo_images_ordered]
-        print(f"[CharacterLibrary] Loaded {len(self.kumomo_characters)} characters: {char_info}")
+        char_log.info("Loaded %s characters: %s", len(self.kumomo_characters), char_info)
 
     def _load_config(self):
         """加载角色配置"""
-        import yaml
-        config_path = Path(__file__).parent.parent.parent / "config" / "characters.yaml"
+        config_path = CHARACTERS_CONFIG_PATH
 
         try:
-            with open(config_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-            self.characters = data.get("characters", {})
+            st = config_path.stat()
+            key = (str(config_path), st.st_mtime_ns, st.st_size)
+            characters = _CHARACTER_CONFIG_CACHE.get(key)
+            if characters is None:
+                with open(config_path, "r", encoding="utf-8") as f:
+                    data = yaml.load(f, Loader=_YamlLoader)
+                characters = data.get("characters", {})
+                _CHARACTER_CONFIG_CACHE.clear()
+                _CHARACTER_CONFIG_CACHE[key] = characters
+            self.characters = characters
         except Exception as e:
-            print(f"[CharacterLibrary] Warning: {e}")
+            char_log.warning("%s", e)
             self.characters = {}
+        self._resolve_config_images()
+
+    def _resolve_config_images(self):
+        """预先解析 YAML 配置中的参考图路径，每个文件只检查一次是否存在"""
+        self._config_main_paths = {}  # name -> [path, ...]
+        self._config_expression_paths = {}  # (name, emotion) -> path
+
+        for char_name, char in self.characters.items():
+            ref_images = (char or {}).get("reference_images") or {}
+            main_paths = []
+            for img_path in ref_images.get("main") or []:
+                full_path = self.image_base_path / img_path
+                if full_path.exists():
+                    main_paths.append(str(full_path))
+            self._config_main_paths[char_name] = main_paths
+
+            for emotion, expr_path in (ref_images.get("expressions") or {}).items():
+                if expr_path:
+                    full_path = self.image_base_path / expr_path
+                    if full_path.exists():
+                        self._config_expression_paths[(char_name, emotion)] = str(full_path)
 
     def get_reference_images(self, char_name: str, emotion: str = None) -> List[str]:
         """获取角色参考图片路径"""
-        image_paths = []
-        char_name_lower = char_name.lower()
-
         # 检查是否是 kumomo 原创角色
-        normalized_name = self.kumomo_characters.get(char_name_lower)
-        if normalized_name:
-            # 使用 kumomo 原创角色的参考图片
-            img_filename = self.kumomo_images.get(normalized_name)
-            if img_filename:
-                full_path = self.image_base_path / img_filename
-                if full_path.exists():
-                    image_paths.append(str(full_path))
-                    return image_paths
-
-        # 回退到 YAML 配置
-        char = self.characters.get(char_name, {})
-        ref_images = char.get("reference_images", {})
-
-        # 主要参考图
-        for img_path in ref_images.get("main", []):
-            full_path = self.image_base_path / img_path
-            if full_path.exists():
-                image_paths.append(str(full_path))
+        kumomo_path = self._kumomo_paths.get(char_name.lower())
+        if kumomo_path:
+            return [kumomo_path]
 
-        # 表情参考图
+        # 回退到 YAML 配置：主要参考图 + 表情参考图
+        image_paths = list(self._config_main_paths.get(char_name, ()))
         if emotion:
-            expr_path = ref_images.get("expressions", {}).get(emotion)
+            expr_path = self._config_expression_paths.get((char_name, emotion))
             if expr_path:
-                full_path = self.image_base_path / expr_path
-                if full_path.exists():
-                    image_paths.append(str(full_path))
+                image_paths.append(expr_path)
 
         return image_paths
 
@@ -1038,12 +1302,7 @@ class CharacterLibrary:
         """
         获取所有原创角色的参考图片（按文件名排序）
         """
-        image_paths = []
-        for char_name, img_filename in self.kumomo_images_ordered:
-            full_path = self.image_base_path / img_filename
-            if full_path.exists():
-                image_paths.append(str(full_path))
-        return image_paths
+        return list(self._kumomo_paths_ordered)
 
     def get_kumomo_character_names(self) -> List[str]:
         """获取所有原创角色名称（按顺序）"""
@@ -1062,26 +1321,21 @@ class CharacterLibrary:
         characters: List[str],
         emotions: Dict[str, str]
     ) -> List[str]:
-        """获取 panel 中所有角色的参考图片"""
-        all_images = []
-        seen = set()
-
-        for char_name in characters:
-            emotion = emotions.get(char_name)
-            for img in self.get_reference_images(char_name, emotion):
-                if img not in seen:
-                    all_images.append(img)
-                    seen.add(img)
-
-        return all_images
+        """获取 panel 中所有角色的参考图片（按出现顺序去重）"""
+        return list(dict.fromkeys(
+            img
+            for char_name in characters
+            for img in self.get_reference_images(char_name, emotions.get(char_name))
+        ))
 
     def has_reference_images(self, char_name: str) -> bool:
         """检查角色是否有参考图片"""
-        return len(self.get_reference_images(char_name)) > 0
+        return bool(self.get_reference_images(char_name))
 
 
 # 全局实例
 _storyboarder: Optional[Storyboarder] = None
+_character_library: Optional[CharacterLibrary] = None
 
 # Cache version - increment this to invalidate all cached storyboards
 # v2: Added translation context fix for zh-CN
@@ -1102,18 +1356,171 @@ _storyboarder: Optional[Storyboarder] = None
 # v17: Enforce dialogue length limits (40 chars CJK, 100 chars EN) to fit speech bubbles
 # v18: Fix dialogue parsing - apostrophes in contractions (don't, aren't) were causing truncation
 # v19: Translate ALL text fields (dialogue + narration + title), not just dialogue
-CACHE_VERSION = 19
+# v20: Papers longer than ANALYSIS_MAX_CHARS are analyzed in parts instead of truncated
+# v21: Skip the technical analysis step for short inputs (manga_settings.skip_analysis_under_chars)
+# v22: Character reference images are actually sent in Step 2 (were dropped without is_base64)
+# v23: Storyboard prompt puts the source material last (static, cacheable prefix first)
+# v24: Multi-part analyses are trimmed per part to fit STORYBOARD_MAX_CHARS instead of losing later parts
+CACHE_VERSION = 24
+
+# 内存缓存条目上限，超出后按 LRU 淘汰
+STORYBOARD_CACHE_SIZE = 32
+
+# 每个翻译请求最多包含的文本行数（超出则拆成多个请求并发翻译）
+TRANSLATION_CHUNK_LINES = 80
+# 同时进行的翻译请求数上限（受 API 并发配额限制）
+TRANSLATION_MAX_CONCURRENCY = 4
+# 同时进行的技术解读请求数上限（超长论文分段解读时）
+ANALYSIS_MAX_CONCURRENCY = 4
+# 分段技术解读的内存缓存条目上限，超出后按 LRU 淘汰
+ANALYSIS_CACHE_SIZE = 64
+
+# 各步骤的生成参数（只读，所有请求共用）
+_ANALYSIS_CONFIG = GenerationConfig(temperature=0.3, max_tokens=32000)  # 低温度确保准确性，足够生成完整技术分析
+_STORYBOARD_CONFIG = GenerationConfig(temperature=0.7, max_tokens=32000)  # 足够生成 100+ 个分镜
+_TRANSLATION_CONFIG = GenerationConfig(temperature=0.3, max_tokens=32000)  # 足够翻译所有内容
+
+# 分镜磁盘缓存目录，文件名为缓存键（已含 CACHE_VERSION 和配置指纹，变化后旧文件自然失效）
+STORYBOARD_CACHE_DIR = PROJECT_ROOT / "output" / "storyboard_cache"
+# 磁盘缓存的文件数上限（超出后删除最久未使用的）和最长保留时间（秒）
+STORYBOARD_DISK_CACHE_SIZE = 256
+STORYBOARD_DISK_CACHE_MAX_AGE = 30 * 24 * 3600
+
+# Simple storyboard cache (cache key -> serialized storyboard JSON), LRU order
+# 只保存序列化后的 JSON 字节：约为 Panel 对象树一半的内存；每次命中都解析出新对象，调用方修改不会污染缓存
+_storyboard_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+# 分段技术解读缓存（该段 prompt 的 sha256 -> 解读文本），LRU order
+_analysis_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _dump_storyboard(storyboard: Storyboard) -> bytes:
+    """把分镜完整序列化为 JSON 字节（内存缓存和磁盘缓存共用）"""
+    data = dataclasses.asdict(storyboard)
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def _load_storyboard(payload: bytes) -> Storyboard:
+    """从 _dump_storyboard 的输出还原分镜"""
+    data = _json_loads(payload)
+    panels = [
+        Panel(**{**p, "panel_type": PanelType(p["panel_type"])})
+        for p in data.pop("panels")
+    ]
+    return Storyboard(**data, panels=panels)
+
+
+def _remember_storyboard(cache_key: str, payload: bytes) -> None:
+    """放入内存缓存，超出上限时淘汰最久未使用的条目"""
+    _storyboard_cache[cache_key] = payload
+    _storyboard_cache.move_to_end(cache_key)
+    while len(_storyboard_cache) > STORYBOARD_CACHE_SIZE:
+        _storyboard_cache.popitem(last=False)
+
+
+def _remember_analysis(part_key: str, content: str) -> None:
+    """放入分段技术解读缓存，超出上限时淘汰最久未使用的条目"""
+    _analysis_cache[part_key] = content
+    _analysis_cache.move_to_end(part_key)
+    while len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+        _analysis_cache.popitem(last=False)
+
+
+async def _get_cached_storyboard(cache_key: str) -> Optional[Storyboard]:
+    """依次查找内存缓存和磁盘缓存，磁盘命中后放回内存"""
+    payload = _storyboard_cache.get(cache_key)
+    if payload is not None:
+        log.info("Using cached storyboard for %s", cache_key)
+        _storyboard_cache.move_to_end(cache_key)
+        return _load_storyboard(payload)
+
+    payload = await asyncio.to_thread(_read_cached_storyboard, cache_key)
+    if payload is None:
+        return None
+    try:
+        storyboard = _load_storyboard(payload)
+    except (ValueError, TypeError, KeyError) as e:
+        log.warning("Ignoring unreadable storyboard cache %s: %s", cache_key, e)
+        return None
+    log.info("Using disk-cached storyboard for %s", cache_key)
+    _remember_storyboard(cache_key, payload)
+    return storyboard
+
+
+async def _cache_storyboard(cache_key: str, storyboard: Storyboard) -> None:
+    """写入内存缓存和磁盘缓存；磁盘写入失败不影响本次结果"""
+    payload = _dump_storyboard(storyboard)
+    _remember_storyboard(cache_key, payload)
+    try:
+        await asyncio.to_thread(_write_cached_storyboard, cache_key, payload)
+    except OSError as e:
+        log.warning("Failed to write storyboard cache %s: %s", cache_key, e)
+
+
+def _read_cached_storyboard(cache_key: str) -> Optional[bytes]:
+    """读取磁盘缓存文件，不存在或已过期时返回 None；命中时刷新修改时间，供 LRU 淘汰使用"""
+    path = STORYBOARD_CACHE_DIR / f"{cache_key}.json"
+    try:
+        if time.time() - path.stat().st_mtime > STORYBOARD_DISK_CACHE_MAX_AGE:
+            path.unlink(missing_ok=True)
+            return None
+        payload = path.read_bytes()
+        os.utime(path)
+        return payload
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        log.warning("Ignoring unreadable storyboard cache %s: %s", path.name, e)
+        return None
+
 
-# Simple storyboard cache (text hash -> storyboard)
-_storyboard_cache: Dict[str, Storyboard] = {}
+def _write_cached_storyboard(cache_key: str, payload: bytes) -> None:
+    """
+    写入磁盘缓存并清理过期和超出数量上限的文件
+
+    先写入唯一命名的临时文件再 os.replace，并发写同一个键也不会互相覆盖临时文件，读取方不会看到半截文件
+    """
+    STORYBOARD_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=STORYBOARD_CACHE_DIR, suffix=".tmp", delete=False) as f:
+        f.write(payload)
+    try:
+        os.replace(f.name, STORYBOARD_CACHE_DIR / f"{cache_key}.json")
+    except OSError:
+        os.unlink(f.name)
+        raise
+    _prune_disk_cache()
+
+
+def _prune_disk_cache() -> None:
+    """删除超过 STORYBOARD_DISK_CACHE_MAX_AGE 的缓存文件，再按修改时间只保留最新的 STORYBOARD_DISK_CACHE_SIZE 个"""
+    entries = []
+    for path in STORYBOARD_CACHE_DIR.glob("*.json"):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            continue
+
+    entries.sort(reverse=True)
+    cutoff = time.time() - STORYBOARD_DISK_CACHE_MAX_AGE
+    for index, (mtime, path) in enumerate(entries):
+        if index >= STORYBOARD_DISK_CACHE_SIZE or mtime < cutoff:
+            path.unlink(missing_ok=True)
 
 
 def clear_storyboard_cache() -> int:
-    """Clear the storyboard cache. Returns the number of entries cleared."""
+    """Clear the storyboard cache (memory and disk). Returns the number of entries cleared."""
     global _storyboard_cache
-    count = len(_storyboard_cache)
-    _storyboard_cache = {}
-    print(f"[Storyboarder] Cleared {count} cached storyboards")
+    keys = set(_storyboard_cache)
+    _storyboard_cache = OrderedDict()
+    _analysis_cache.clear()
+    if STORYBOARD_CACHE_DIR.exists():
+        for path in STORYBOARD_CACHE_DIR.glob("*.json"):
+            keys.add(path.stem)
+            path.unlink(missing_ok=True)
+    count = len(keys)
+    log.info("Cleared %s cached storyboards", count)
     return count
 
 
@@ -1135,3 +1542,17 @@ def reset_storyboarder() -> None:
     """重置分镜生成器"""
     global _storyboarder
     _storyboarder = None
+
+
+def get_character_library() -> CharacterLibrary:
+    """获取角色库实例（进程内共享，/config/reload 时通过 reset_character_library 重新扫描）"""
+    global _character_library
+    if _character_library is None:
+        _character_library = CharacterLibrary()
+    return _character_library
+
+
+def reset_character_library() -> None:
+    """重置角色库"""
+    global _character_library
+    _character_library = None